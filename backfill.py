@@ -0,0 +1,159 @@
+"""Backfill the long-term statistics of Growatt power sensors after an outage.
+
+The hours of an outage are recorded with the stale value that kept being
+served. Once the device answers again, they are overwritten in the statistics
+of its output power sensor with the intraday curve of the Growatt server.
+"""
+import datetime
+import logging
+
+from homeassistant.components.recorder.statistics import async_import_statistics
+from homeassistant.const import POWER_WATT
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# Statistics of entities are owned by the recorder.
+STATISTICS_SOURCE = "recorder"
+
+# API call returning the intraday power curve of a day, by device type.
+DAY_DATA = {"inverter": "inverter_data", "tlx": "tlx_data"}
+
+# Outages shorter than this are left to the regular polls.
+MIN_GAP = datetime.timedelta(minutes=15)
+
+HOUR = datetime.timedelta(hours=1)
+
+
+def day_points(response, date):
+    """Yield the (utc time, watts) points of a day curve in time order.
+
+    The curve comes as {"obj": {"pac": {"YYYY-MM-DD HH:MM": watts}}} in the
+    local time of the plant, which is taken to be Home Assistant's.
+    """
+    curve = (response.get("obj") or {}).get("pac") or {}
+    for timestamp in sorted(curve):
+        try:
+            local = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
+            value = float(curve[timestamp])
+        except (TypeError, ValueError):
+            continue
+        if local.date() != date:
+            continue
+        yield dt_util.as_utc(local.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)), value
+
+
+def hourly_statistics(points, start, end):
+    """Aggregate time ordered points into hourly mean/min/max statistics.
+
+    Only full hours overlapping [start, end) are returned.
+    """
+    first_hour = start.replace(minute=0, second=0, microsecond=0)
+    statistics = []
+    hour = None
+    values = []
+    for time, value in points:
+        point_hour = time.replace(minute=0, second=0, microsecond=0)
+        if point_hour != hour:
+            if values:
+                statistics.append(_hour_statistic(hour, values))
+            hour = point_hour
+            values = []
+        if first_hour <= point_hour and point_hour + HOUR <= end:
+            values.append(value)
+    if values:
+        statistics.append(_hour_statistic(hour, values))
+    return statistics
+
+
+def _hour_statistic(hour, values):
+    """Return the statistic of an hour of values."""
+    return {
+        "start": hour,
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def local_days(start, end):
+    """Yield the local dates from `start` up to and including `end`."""
+    date = dt_util.as_local(start).date()
+    last = dt_util.as_local(end).date()
+    while date <= last:
+        yield date
+        date += datetime.timedelta(days=1)
+
+
+class GrowattBackfill:
+    """Detect outages of devices and fill them from their day curves.
+
+    The curves are fetched one day at a time and imported into the hourly
+    statistics of the output power sensor, so at most one day is held in
+    memory.
+    """
+
+    def __init__(self, hass):
+        """Initialize without any known outages."""
+        self.hass = hass
+        self._last_success = {}
+        self._outages = {}
+
+    def record(self, probe, success, now):
+        """Note the outcome of a fetch, return the gap to fill once it succeeds again."""
+        if probe.growatt_type not in DAY_DATA:
+            return None
+        device_id = probe.device_id
+        if not success:
+            self._outages.setdefault(device_id, self._last_success.get(device_id, now))
+            return None
+        self._last_success[device_id] = now
+        start = self._outages.pop(device_id, None)
+        if start is None or now - start < MIN_GAP:
+            return None
+        return start, now
+
+    def fill(self, probe, entity_id, start, end):
+        """Fill a gap of a device through the sync client."""
+        fetch = getattr(probe.api, DAY_DATA[probe.growatt_type])
+        for date in local_days(start, end):
+            try:
+                response = fetch(probe.device_id, date)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unable to backfill %s for %s", probe.device_id, date)
+                return
+            statistics = hourly_statistics(day_points(response, date), start, end)
+            if statistics:
+                self.hass.add_job(
+                    async_import_statistics,
+                    self.hass,
+                    self._metadata(entity_id),
+                    statistics,
+                )
+
+    async def async_fill(self, probe, entity_id, start, end):
+        """Fill a gap of a device through the async client."""
+        fetch = getattr(probe.api, DAY_DATA[probe.growatt_type])
+        for date in local_days(start, end):
+            try:
+                response = await fetch(probe.device_id, date)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unable to backfill %s for %s", probe.device_id, date)
+                return
+            statistics = hourly_statistics(day_points(response, date), start, end)
+            if statistics:
+                async_import_statistics(
+                    self.hass, self._metadata(entity_id), statistics
+                )
+
+    @staticmethod
+    def _metadata(entity_id):
+        """Return the metadata of the statistics of a power sensor."""
+        return {
+            "has_mean": True,
+            "has_sum": False,
+            "name": None,
+            "source": STATISTICS_SOURCE,
+            "statistic_id": entity_id,
+            "unit_of_measurement": POWER_WATT,
+        }
@@ -0,0 +1,159 @@
+"""Microbenchmark of the per-entity cost of reading sensor properties.
+
+Home Assistant reads the name, state, device class and unit of every sensor on
+every state write. This creates plants with thousands of sensors fed with mock
+payloads and times those reads through the compiled sensor descriptions,
+against the previous per-access SENSOR_TYPES lookups. `compiled_us` reads
+payloads whose values did not move, `changed_us` a new payload every round:
+
+    python benchmarks/bench_entity_state.py --devices 100 500 --rounds 20
+"""
+import argparse
+import itertools
+import random
+import time
+
+from bench_update_cycle import PACKAGE, load_integration
+import mock_server
+
+PAYLOADS = {
+    "inverter": lambda rand, serial: mock_server.inverter_detail(rand, serial),
+    "tlx": lambda rand, serial: mock_server.tlx_detail(rand, serial)["data"],
+    "mix": lambda rand, serial: mock_server.mix_status(rand, serial)["obj"],
+    "storage": lambda rand, serial: {
+        **mock_server.storage_params(rand, serial)["storageDetailBean"],
+        **mock_server.storage_energy_overview(rand, serial)["obj"],
+    },
+}
+
+
+def legacy_entity_class(sensor):
+    """Return a sensor class reading its properties the way it did before descriptions."""
+
+    class LegacyGrowattInverter(sensor.GrowattInverter):
+        """GrowattInverter indexing SENSOR_TYPES on every property access."""
+
+        def __init__(self, entity):
+            super().__init__(
+                entity.coordinator,
+                entity.probe,
+                entity.probe.device_id,
+                entity.description,
+                entity.unique_id,
+            )
+            self._name = entity.probe.device_id
+
+        @property
+        def name(self):
+            return f"{self._name} {sensor.SENSOR_TYPES[self.sensor][0]}"
+
+        @property
+        def state(self):
+            result = self.probe.get_data(sensor.SENSOR_TYPES[self.sensor][2])
+            round_to = sensor.SENSOR_TYPES[self.sensor][3].get("round")
+            # The original rounded without coercion and failed on strings.
+            if round_to is not None and isinstance(result, (int, float)):
+                result = round(result, round_to)
+            return result
+
+        @property
+        def device_class(self):
+            return sensor.SENSOR_TYPES[self.sensor][3].get("device_class")
+
+        @property
+        def unit_of_measurement(self):
+            return sensor.SENSOR_TYPES[self.sensor][1]
+
+    return LegacyGrowattInverter
+
+
+def properties(entity):
+    """Read the properties of an entity."""
+    return entity.name, entity.state, entity.device_class, entity.unit_of_measurement
+
+
+def read_state(entity):
+    """Read the value of a sensor from its probe, then its properties.
+
+    Sensors read their value once per payload, the legacy ones on every
+    state read, so that is counted in.
+    """
+    return entity.update_state(), properties(entity)
+
+
+def create_entities(sensor, devices):
+    """Create the sensors of a plant of `devices` devices fed with mock payloads.
+
+    Returns the sensors and two payloads of different values for every probe.
+    """
+    rand = random.Random(0)
+    config = sensor.PLATFORM_SCHEMA(
+        {"platform": PACKAGE, sensor.CONF_USERNAME: "bench", sensor.CONF_PASSWORD: "bench"}
+    )
+    plants = sensor.GrowattPlants(None, config, None)
+    device_list = [
+        {"deviceSn": f"SN{index:05d}", "deviceType": device_type, "deviceAilas": f"Device {index}"}
+        for index, device_type in zip(range(devices), itertools.cycle(PAYLOADS))
+    ]
+    entities, _ = plants.update({"1": "Bench"}, [device_list])
+    payloads = []
+    for coordinator in plants.coordinators.values():
+        for probe in coordinator.probes:
+            if probe.growatt_type in PAYLOADS:
+                pair = [
+                    PAYLOADS[probe.growatt_type](rand, probe.device_id) for _ in range(2)
+                ]
+                probe.data = pair[0]
+                payloads.append((probe, pair))
+    return entities, payloads
+
+
+def timed(rounds, function, entities, payloads=()):
+    """Return the mean time in seconds of calling `function` for all entities.
+
+    Every round switches the probes of `payloads` to their other payload.
+    """
+    started = time.perf_counter()
+    for index in range(rounds):
+        for probe, pair in payloads:
+            probe.data = pair[index % 2]
+        for entity in entities:
+            function(entity)
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    """Time property reads for every requested plant size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    sensor = load_integration()
+    legacy_class = legacy_entity_class(sensor)
+    columns = ("devices", "entities", "legacy_us", "compiled_us", "changed_us", "legacy_ms")
+    print(" ".join(f"{column:>12}" for column in columns))
+    for devices in args.devices:
+        entities, payloads = create_entities(sensor, devices)
+        legacy_entities = [legacy_class(entity) for entity in entities]
+        legacy = timed(args.rounds, properties, legacy_entities)
+        compiled = timed(args.rounds, read_state, entities)
+        changed = timed(args.rounds, read_state, entities, payloads)
+        result = (
+            devices,
+            len(entities),
+            legacy / len(entities) * 1e6,
+            compiled / len(entities) * 1e6,
+            changed / len(entities) * 1e6,
+            legacy * 1e3,
+        )
+        print(
+            " ".join(
+                f"{value:>12.2f}" if isinstance(value, float) else f"{value:>12}"
+                for value in result
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
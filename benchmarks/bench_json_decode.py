@@ -0,0 +1,122 @@
+"""Benchmark decoding of API response bodies.
+
+Times the decoding of the response bodies of one update cycle, a plant of
+`--devices` devices, with the previous `json.loads(content.decode("utf-8"))`,
+the stdlib decoder on the bytes and orjson when it is installed. It reports
+CPU time and peak traced allocations per cycle:
+
+    python benchmarks/bench_json_decode.py --devices 10 100 500
+
+The bodies are generated by the mock server, pass `--payloads DIR` to use
+response bodies captured from the real server (`*.json`) instead.
+"""
+import argparse
+import itertools
+import json
+import pathlib
+import random
+import time
+import tracemalloc
+
+import mock_server
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Mock server payloads answering the detail calls of each device type.
+PAYLOADS = {
+    "inverter": [mock_server.inverter_detail],
+    "tlx": [mock_server.tlx_detail],
+    "mix": [mock_server.mix_status],
+    "storage": [mock_server.storage_params, mock_server.storage_energy_overview],
+}
+
+DECODERS = {
+    "legacy": lambda content: json.loads(content.decode("utf-8")),
+    "stdlib": json.loads,
+}
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+
+
+def mock_bodies(devices):
+    """Return the response bodies of a cycle over a plant of `devices` devices."""
+    rand = random.Random(0)
+    bodies = []
+    for index, device_type in zip(range(devices), itertools.cycle(PAYLOADS)):
+        for payload in PAYLOADS[device_type]:
+            bodies.append(json.dumps(payload(rand, f"SN{index:05d}")).encode())
+    return bodies
+
+
+def captured_bodies(directory, devices):
+    """Return `devices` rounds of the captured bodies in `directory`."""
+    captured = [path.read_bytes() for path in sorted(pathlib.Path(directory).glob("*.json"))]
+    if not captured:
+        raise SystemExit(f"No *.json payloads in {directory}")
+    return [body for _, body in zip(range(devices), itertools.cycle(captured))]
+
+
+def timed(decode, bodies, rounds):
+    """Return the fastest time of decoding all bodies, over `rounds` rounds."""
+    best = None
+    for _ in range(rounds):
+        started = time.process_time()
+        for body in bodies:
+            decode(body)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def allocated(decode, bodies):
+    """Return the peak traced memory of decoding all bodies, keeping the results."""
+    tracemalloc.start()
+    results = [decode(body) for body in bodies]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return peak
+
+
+def main():
+    """Run the benchmark for every requested plant size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--payloads", help="directory with captured response bodies")
+    args = parser.parse_args()
+
+    columns = ("devices", "bodies", "kib", "decoder", "cpu_ms", "peak_kib", "speedup")
+    print(" ".join(f"{column:>10}" for column in columns))
+    for devices in args.devices:
+        if args.payloads:
+            bodies = captured_bodies(args.payloads, devices)
+        else:
+            bodies = mock_bodies(devices)
+        size = sum(len(body) for body in bodies) / 1024
+        baseline = None
+        for name, decode in DECODERS.items():
+            cpu = timed(decode, bodies, args.rounds)
+            baseline = cpu if baseline is None else baseline
+            result = (
+                devices,
+                len(bodies),
+                size,
+                name,
+                cpu * 1e3,
+                allocated(decode, bodies) / 1024,
+                baseline / cpu if cpu else float("inf"),
+            )
+            print(
+                " ".join(
+                    f"{value:>10.2f}" if isinstance(value, float) else f"{value:>10}"
+                    for value in result
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
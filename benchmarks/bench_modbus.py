@@ -0,0 +1,72 @@
+"""Benchmark local Modbus reads with and without batching.
+
+Reads every register of `--devices` simulated devices of each type behind one
+ModbusSimulator, once with the batched reads of the integration and once
+with one read per register, and reports the requests and time per cycle:
+
+    python benchmarks/bench_modbus.py --devices 1 10 --latency 0.005
+"""
+import argparse
+import statistics
+import time
+
+from modbus_simulator import ModbusSimulator
+
+DEVICE_TYPES = ("inverter", "tlx", "mix", "storage")
+
+
+def per_register(registers):
+    """Return reads of one register each, the way a naive client would read."""
+    return [(register.address, register.words, (register,)) for register in registers]
+
+
+def run(devices, cycles, latency, batched):
+    """Return the requests and seconds of `cycles` cycles over the simulator."""
+    device_types = [device_type for _ in range(devices) for device_type in DEVICE_TYPES]
+    with ModbusSimulator(device_types, latency=latency) as simulator:
+        modbus = simulator.modbus
+        host, port = simulator.address
+        api = modbus.GrowattModbusApi(
+            modbus.ModbusDevice(f"SN{unit}", device_type, host, port, unit)
+            for unit, device_type in simulator.device_types.items()
+        )
+        reads = {
+            device_type: (
+                modbus.batch_reads(registers) if batched else per_register(registers)
+            )
+            for device_type, registers in modbus.REGISTERS_BY_DEVICE_TYPE.items()
+        }
+        durations = []
+        for _ in range(cycles):
+            started = time.perf_counter()
+            for unit, device_type in simulator.device_types.items():
+                api.read(f"SN{unit}", reads[device_type])
+            durations.append(time.perf_counter() - started)
+        api.close()
+        return simulator.total_requests / cycles, statistics.median(durations)
+
+
+def main():
+    """Run the benchmark for every number of devices."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    columns = ("devices", "method", "requests_per_cycle", "p50_ms")
+    print(" ".join(f"{column:>18}" for column in columns))
+    for devices in args.devices:
+        for name, batched in (("batched", True), ("per_register", False)):
+            requests, duration = run(devices, args.cycles, args.latency, batched)
+            result = (devices * len(DEVICE_TYPES), name, requests, duration * 1000)
+            print(
+                " ".join(
+                    f"{value:>18.2f}" if isinstance(value, float) else f"{value:>18}"
+                    for value in result
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark rolling statistics against rescanning the samples of the window.
+
+Feeds a day of samples, one every `--interval` seconds, to the rolling
+windows of a sensor and reads the statistics after every sample, like a
+state write does. It compares the bucketed RollingWindow with keeping the
+samples of the last day in a list and scanning them, and reports the time
+per sample and the bytes held per sensor:
+
+    python benchmarks/bench_rolling_statistics.py --interval 10 30 300
+"""
+import argparse
+import random
+import sys
+import time
+
+from bench_update_cycle import load_integration
+
+DAY = 86400
+
+
+def bucketed(sensor, samples):
+    """Feed the samples to RollingWindows, return the seconds taken and bytes held."""
+    windows = [
+        sensor.RollingWindow(span.total_seconds(), buckets)
+        for _, span, buckets in sensor.ROLLING_WINDOWS
+    ]
+    started = time.perf_counter()
+    for now, value in samples:
+        for window in windows:
+            window.add(now, value)
+            window.stats(now)
+    elapsed = time.perf_counter() - started
+    size = sum(
+        sys.getsizeof(array)
+        for window in windows
+        for array in (window.slots, window.mins, window.maxs, window.sums, window.counts)
+    )
+    return elapsed, size
+
+
+def rescanned(sensor, samples):
+    """Keep the samples in a list and scan each window, return seconds and bytes."""
+    spans = [span.total_seconds() for _, span, _ in sensor.ROLLING_WINDOWS]
+    kept = []
+    started = time.perf_counter()
+    for now, value in samples:
+        kept.append((now, value))
+        while kept[0][0] <= now - DAY:
+            kept.pop(0)
+        for span in spans:
+            values = [value for at, value in kept if at > now - span]
+            min(values), max(values), sum(values) / len(values)
+    elapsed = time.perf_counter() - started
+    size = sys.getsizeof(kept) + sum(
+        sys.getsizeof(sample) + 2 * sys.getsizeof(0.0) for sample in kept
+    )
+    return elapsed, size
+
+
+def main():
+    """Run the benchmark for every sample interval."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=int, nargs="+", default=[10, 30, 300])
+    args = parser.parse_args()
+
+    sensor = load_integration()
+    rand = random.Random(0)
+    columns = ("interval_s", "samples", "method", "us_per_sample", "bytes")
+    print(" ".join(f"{column:>14}" for column in columns))
+    for interval in args.interval:
+        samples = [
+            (float(now), rand.uniform(20, 60)) for now in range(0, 2 * DAY, interval)
+        ]
+        for name, method in (("bucketed", bucketed), ("rescan", rescanned)):
+            elapsed, size = method(sensor, samples)
+            result = (interval, len(samples), name, elapsed / len(samples) * 1e6, size)
+            print(
+                " ".join(
+                    f"{value:>14.2f}" if isinstance(value, float) else f"{value:>14}"
+                    for value in result
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
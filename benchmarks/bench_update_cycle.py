@@ -0,0 +1,247 @@
+"""Benchmark setup and update cycles of the integration against the mock server.
+
+For every plant size the benchmark runs `setup_platform` against a fresh
+MockGrowattServer, then times a number of plant update cycles, each of which
+calls `GrowattData.update()` for every probe. It reports the requests made per
+cycle, p50/p99 cycle latency and peak traced memory:
+
+    python benchmarks/bench_update_cycle.py --devices 1 10 100 500 --latency 0.02
+
+With `--enabled 0.1` only a random tenth of the sensors is enabled, so only
+the endpoints they read are called.
+
+`--record FILE` records the traffic of a run to an archive, `--replay FILE`
+runs against that archive instead of the mock server, as fast as possible or
+with `--replay-timing original` at the recorded latencies. `--derived` adds
+every built-in derived sensor.
+
+Home Assistant has to be installed, the integration is loaded from this
+checkout.
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import importlib
+import importlib.util
+import pathlib
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+from homeassistant.core import HomeAssistant
+
+from mock_server import MockGrowattServer
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+PACKAGE = "growatt"
+
+
+def load_integration():
+    """Import the integration in this checkout as the `growatt` package."""
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = module
+        spec.loader.exec_module(module)
+    return importlib.import_module(f"{PACKAGE}.sensor")
+
+
+class BenchBus:
+    """Event bus that only fires the stop listeners, when the benchmark ends."""
+
+    def __init__(self):
+        """Initialize without listeners."""
+        self.stop_listeners = []
+
+    def listen_once(self, event_type, listener):
+        """Register a listener, called by BenchHass.stop()."""
+        self.stop_listeners.append(listener)
+        return lambda: None
+
+
+class BenchHass(HomeAssistant):
+    """The parts of Home Assistant used by setup_platform, on a real event loop."""
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        """Run an event loop on a background thread."""
+        self.loop = asyncio.new_event_loop()
+        self.bus = BenchBus()
+        self.config = types.SimpleNamespace(
+            latitude=52.37, longitude=4.89, elevation=0, time_zone="UTC"
+        )
+        self.data = {}
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Call the stop listeners, which close a recording, and stop the loop."""
+        for listener in self.bus.stop_listeners:
+            listener(None)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(
+    sensor,
+    plants,
+    devices,
+    cycles,
+    latency,
+    max_workers,
+    session_ttl,
+    max_request_rate,
+    enabled,
+    options=None,
+):
+    """Benchmark `plants` plants of `devices` devices and return the measurements.
+
+    `options` are added to the platform config, the mock server is not
+    started when they replay an archive.
+    """
+    options = options or {}
+    server = None
+    if sensor.CONF_REPLAY not in options:
+        server = MockGrowattServer(
+            plants=plants, devices=devices, latency=latency, session_ttl=session_ttl
+        )
+        sensor.GrowattApi.server_url = server.url
+        sensor.AsyncGrowattApi.server_url = server.url
+    hass = BenchHass()
+    entities = []
+    config = sensor.PLATFORM_SCHEMA(
+        {
+            "platform": PACKAGE,
+            sensor.CONF_USERNAME: "bench",
+            sensor.CONF_PASSWORD: "bench",
+            sensor.CONF_MAX_WORKERS: max_workers,
+            sensor.CONF_CACHE_DEVICES: False,
+            sensor.CONF_MAX_REQUEST_RATE: max_request_rate,
+            **options,
+        }
+    )
+
+    with server or contextlib.nullcontext():
+        tracemalloc.start()
+        started = time.perf_counter()
+        sensor.setup_platform(hass, config, entities.extend)
+        setup_time = time.perf_counter() - started
+        setup_requests = server.total_requests if server else "-"
+
+        # Every plant has its own coordinator, Home Assistant runs their cycles
+        # side by side on its executor.
+        coordinators = list(
+            {id(entity.coordinator): entity.coordinator for entity in entities}.values()
+        )
+        # Enabled sensors listen to their coordinator like they do once added
+        # to Home Assistant, state writes are not part of the benchmark.
+        for entity in random.Random(0).sample(entities, round(len(entities) * enabled)):
+            entity.schedule_update_ha_state = lambda force_refresh=False: None
+            entity.coordinator.add_listener(entity)
+        durations = []
+        requests = []
+        with ThreadPoolExecutor(max_workers=len(coordinators)) as executor:
+            for _ in range(cycles):
+                started = time.perf_counter()
+                budgets = list(
+                    executor.map(lambda coordinator: coordinator.refresh(), coordinators)
+                )
+                durations.append(time.perf_counter() - started)
+                requests.append(sum(budget.used for budget in budgets if budget))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        for coordinator in coordinators:
+            coordinator.stop()
+
+    hass.stop()
+    return {
+        "plants": plants,
+        "devices": devices,
+        "entities": len(entities),
+        "setup_s": setup_time,
+        "setup_requests": setup_requests,
+        "requests_per_cycle": statistics.mean(requests),
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "peak_mib": peak / 2 ** 20,
+        "logins": server.logins if server else "-",
+    }
+
+
+def main():
+    """Run the benchmark for every requested plant size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plants", type=int, default=1)
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--session-ttl", type=float, default=None)
+    # The account-wide rate limit is lifted by default to time the client itself.
+    parser.add_argument("--max-request-rate", type=float, default=10000.0)
+    parser.add_argument(
+        "--enabled", type=float, default=1.0, help="share of the sensors enabled"
+    )
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--record", help="record the traffic to this archive")
+    transport.add_argument("--replay", help="replay an archive instead of the mock server")
+    parser.add_argument("--replay-timing", choices=("original", "fast"), default="fast")
+    parser.add_argument(
+        "--derived", action="store_true", help="add every built-in derived sensor"
+    )
+    args = parser.parse_args()
+
+    sensor = load_integration()
+    options = {}
+    if args.record:
+        options[sensor.CONF_RECORD] = args.record
+    elif args.replay:
+        options[sensor.CONF_REPLAY] = args.replay
+        options[sensor.CONF_REPLAY_TIMING] = args.replay_timing
+    if args.derived:
+        options[sensor.CONF_DERIVED_SENSORS] = [
+            key for types in sensor.DERIVED_SENSOR_TYPES.values() for key in types
+        ]
+    columns = (
+        "plants", "devices", "entities", "setup_s", "setup_requests", "requests_per_cycle",
+        "p50_ms", "p99_ms", "peak_mib", "logins",
+    )
+    print(" ".join(f"{column:>18}" for column in columns))
+    for devices in args.devices:
+        result = run(
+            sensor,
+            args.plants,
+            devices,
+            args.cycles,
+            args.latency,
+            args.max_workers,
+            args.session_ttl,
+            args.max_request_rate,
+            args.enabled,
+            options,
+        )
+        print(
+            " ".join(
+                f"{result[column]:>18.2f}" if isinstance(result[column], float)
+                else f"{result[column]:>18}"
+                for column in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Replay Growatt datalogger frames to a receiver, like a ShineWiFi would push them.
+
+Data frames are built from the synthetic register banks of the Modbus
+simulator for `--devices`, with serials SN1, SN2, ... like its units, or
+read from a `--capture` file of raw frames as sent by a real datalogger.
+Every frame is sent in `--chunk` byte pieces to exercise the incremental
+decoding, and the time until the receiver acknowledges it is reported.
+
+Point the `datalogger_port` option at it, with devices of the same serials:
+
+    python benchmarks/datalogger_replayer.py --port 5279 --devices inverter tlx
+
+or measure the in-process receiver, from the last byte sent to the record
+handed to its callback:
+
+    python benchmarks/datalogger_replayer.py --local --frames 200 --chunk 7
+"""
+import argparse
+import asyncio
+import importlib.util
+import random
+import statistics
+import time
+
+from modbus_simulator import ROOT, load_modbus, register_bank
+
+
+def load_datalogger():
+    """Import datalogger.py of this checkout, it does not need Home Assistant."""
+    spec = importlib.util.spec_from_file_location(
+        "growatt_datalogger", ROOT / "datalogger.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_frames(datalogger, device_types, frames, protocol, seed=0):
+    """Return `frames` data frames cycling over one device of each type."""
+    modbus = load_modbus()
+    rand = random.Random(seed)
+    records = []
+    for unit, device_type in enumerate(device_types, 1):
+        bank = register_bank(modbus, device_type, rand)
+        blocks = [
+            (start, [bank.get(address, 0) for address in range(start, start + count)])
+            for start, count, _ in modbus.batch_reads(
+                modbus.REGISTERS_BY_DEVICE_TYPE[device_type]
+            )
+        ]
+        records.append(
+            datalogger.encode_record(protocol, f"DL{unit}", f"SN{unit}", blocks)
+        )
+    return [
+        datalogger.encode_frame(
+            index & 0xFFFF,
+            protocol,
+            1,
+            datalogger.FUNCTION_DATA,
+            records[index % len(records)],
+        )
+        for index in range(frames)
+    ]
+
+
+def captured_frames(datalogger, path):
+    """Return the frames of a capture file of raw datalogger traffic."""
+    with open(path, "rb") as capture:
+        return [frame.raw for frame in datalogger.FrameDecoder().feed(capture.read())]
+
+
+async def replay(datalogger, frames, host, port, chunk, interval, delivered=None):
+    """Send the frames and return the seconds until each one was handled.
+
+    Without `delivered`, a queue the receiver's callback puts on, a frame is
+    handled once its acknowledgement is back.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    decoder = datalogger.FrameDecoder()
+    latencies = []
+    try:
+        for frame in frames:
+            for offset in range(0, len(frame), chunk):
+                writer.write(frame[offset : offset + chunk])
+                await writer.drain()
+            sent = time.perf_counter()
+            if delivered is not None:
+                await delivered.get()
+            else:
+                while not decoder.feed(await reader.read(4096)):
+                    pass
+            latencies.append(time.perf_counter() - sent)
+            if interval:
+                await asyncio.sleep(interval)
+    finally:
+        writer.close()
+    return latencies
+
+
+async def run(args):
+    """Replay to the configured or an in-process receiver and return latencies."""
+    datalogger = load_datalogger()
+    if args.capture:
+        frames = captured_frames(datalogger, args.capture)
+    else:
+        frames = synthetic_frames(datalogger, args.devices, args.frames, args.protocol)
+    if not args.local:
+        return await replay(
+            datalogger, frames, args.host, args.port, args.chunk, args.interval
+        )
+    delivered = asyncio.Queue()
+    receiver = datalogger.DataloggerReceiver(
+        delivered.put_nowait, host="127.0.0.1", port=0
+    )
+    await receiver.start()
+    try:
+        return await replay(
+            datalogger,
+            frames,
+            "127.0.0.1",
+            receiver.port,
+            args.chunk,
+            args.interval,
+            delivered,
+        )
+    finally:
+        await receiver.stop()
+
+
+def main():
+    """Replay the frames and report the latencies."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5279)
+    parser.add_argument("--local", action="store_true")
+    parser.add_argument(
+        "--devices", nargs="+", default=["inverter", "tlx", "mix", "storage"]
+    )
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--protocol", type=int, choices=(5, 6), default=6)
+    parser.add_argument("--capture")
+    parser.add_argument("--chunk", type=int, default=1024)
+    parser.add_argument("--interval", type=float, default=0.0)
+    args = parser.parse_args()
+
+    latencies = asyncio.run(run(args))
+    latencies.sort()
+    print(
+        f"frames={len(latencies)}"
+        f" p50_ms={statistics.median(latencies) * 1000:.3f}"
+        f" p99_ms={latencies[int(0.99 * (len(latencies) - 1))] * 1000:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""Local stand-in for server.growatt.com serving synthetic plants.
+
+The server answers the endpoints used by the integration with payloads shaped
+like the real ones and can add latency, failures and session expiry. It counts
+every request so benchmarks can report the number of calls per update cycle.
+
+Run it on its own with:
+
+    python benchmarks/mock_server.py --devices 10 --port 8080
+"""
+import argparse
+import collections
+import http.cookies
+import http.server
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+
+DEVICE_TYPES = ("inverter", "tlx", "mix", "storage")
+
+# Detail payloads of the real server carry far more keys than the integration
+# reads, pad them so parsing and memory costs are realistic.
+PADDING_KEYS = {"inverter": 60, "tlx": 150, "mix": 80, "storage": 120}
+
+
+def _padding(rand, device_type):
+    """Return filler keys similar to the unused fields of a detail payload."""
+    return {
+        f"{device_type}Field{index}": str(round(rand.uniform(0, 500), 1))
+        for index in range(PADDING_KEYS[device_type])
+    }
+
+
+def inverter_detail(rand, serial):
+    """Return a getInverterDetailData payload."""
+    ppv1, ppv2 = rand.uniform(0, 3000), rand.uniform(0, 3000)
+    return {
+        "inverterId": serial,
+        "powerToday": rand.uniform(0, 30),
+        "powerTotal": rand.uniform(1000, 40000),
+        "vpv1": rand.uniform(200, 400),
+        "ipv1": rand.uniform(0, 10),
+        "ppv1": ppv1,
+        "vpv2": rand.uniform(200, 400),
+        "ipv2": rand.uniform(0, 10),
+        "ppv2": ppv2,
+        "vpv3": 0,
+        "ipv3": 0,
+        "ppv3": 0,
+        "ppv": ppv1 + ppv2,
+        "vacr": rand.uniform(220, 240),
+        "iacr": rand.uniform(0, 25),
+        "fac": rand.uniform(49.9, 50.1),
+        "pac": (ppv1 + ppv2) * 0.97,
+        "pacr": rand.uniform(0, 100),
+        "ipmTemperature": rand.uniform(20, 60),
+        "temperature": rand.uniform(20, 60),
+        **_padding(rand, "inverter"),
+    }
+
+
+def tlx_detail(rand, serial):
+    """Return a getTlxDetailData payload, the cloud sends its numbers as strings."""
+    ppv1, ppv2 = rand.uniform(0, 3000), rand.uniform(0, 3000)
+    values = {
+        "eacToday": rand.uniform(0, 30),
+        "eacTotal": rand.uniform(1000, 40000),
+        "vpv1": rand.uniform(200, 400),
+        "ipv1": rand.uniform(0, 10),
+        "ppv1": ppv1,
+        "vpv2": rand.uniform(200, 400),
+        "ipv2": rand.uniform(0, 10),
+        "ppv2": ppv2,
+        "vpv3": 0,
+        "ipv3": 0,
+        "ppv3": 0,
+        "ppv": ppv1 + ppv2,
+        "vacr": rand.uniform(220, 240),
+        "iacr": rand.uniform(0, 25),
+        "fac": rand.uniform(49.9, 50.1),
+        "pac": (ppv1 + ppv2) * 0.97,
+        "pacr": rand.uniform(0, 100),
+        **{f"temp{index}": rand.uniform(20, 60) for index in range(1, 6)},
+    }
+    data = {key: str(round(value, 1)) for key, value in values.items()}
+    return {"data": {"serialNum": serial, **data, **_padding(rand, "tlx")}}
+
+
+def mix_status(rand, serial):
+    """Return a getSystemStatus_KW payload."""
+    ppv1, ppv2 = rand.uniform(0, 3), rand.uniform(0, 3)
+    values = {
+        "vPv1": rand.uniform(200, 400),
+        "vPv2": rand.uniform(200, 400),
+        "vBat": rand.uniform(48, 56),
+        "pPv1": ppv1,
+        "pPv2": ppv2,
+        "ppv": ppv1 + ppv2,
+        "pLocalLoad": rand.uniform(0, 5),
+        "pdisCharge1": rand.uniform(0, 3),
+        "pactogrid": rand.uniform(0, 3),
+        "chargePower": rand.uniform(0, 3),
+        "SOC": rand.uniform(0, 100),
+    }
+    data = {key: str(round(value, 2)) for key, value in values.items()}
+    return {"result": 1, "obj": {"mixSn": serial, **data, **_padding(rand, "mix")}}
+
+
+def storage_params(rand, serial):
+    """Return a getStorageParams_sacolar payload."""
+    return {
+        "storageDetailBean": {
+            "storageSn": serial,
+            "ppv": rand.uniform(0, 3000),
+            "capacity": rand.uniform(0, 100),
+            "pCharge": rand.uniform(-2000, 2000),
+            "rateVA": rand.uniform(0, 5000),
+            "pAcInPut": rand.uniform(0, 3000),
+            "outPutPower": rand.uniform(0, 3000),
+            "vGrid": rand.uniform(220, 240),
+            "vpv": rand.uniform(200, 400),
+            "freqOutPut": rand.uniform(49.9, 50.1),
+            "outPutVolt": rand.uniform(220, 240),
+            "freqGrid": rand.uniform(49.9, 50.1),
+            "iAcCharge": rand.uniform(0, 20),
+            "iChargePV1": rand.uniform(0, 20),
+            "chgCurr": rand.uniform(0, 20),
+            "outPutCurrent": rand.uniform(0, 20),
+            "vBat": rand.uniform(48, 56),
+            "loadPercent": rand.uniform(0, 100),
+            **_padding(rand, "storage"),
+        }
+    }
+
+
+def storage_energy_overview(rand, serial):
+    """Return a getEnergyOverviewData_sacolar payload."""
+    keys = (
+        "eBatDisChargeToday",
+        "eBatDisChargeTotal",
+        "eacDisChargeToday",
+        "eopDischrToday",
+        "eopDischrTotal",
+        "eacChargeToday",
+        "eChargeTotal",
+        "eChargeToday",
+        "eToUserToday",
+        "eToUserTotal",
+    )
+    return {"result": 1, "obj": {key: str(round(rand.uniform(0, 500), 1)) for key in keys}}
+
+
+def day_curve(rand, date):
+    """Return a getInverterData / getTlxData payload with 5 minute points."""
+    points = {
+        f"{date} {minute // 60:02d}:{minute % 60:02d}": round(rand.uniform(0, 3000), 1)
+        for minute in range(0, 24 * 60, 5)
+    }
+    return {"result": 1, "obj": {"pac": points}}
+
+
+class MockGrowattPlant:
+    """A synthetic plant with a fixed list of devices."""
+
+    def __init__(self, plant_id, devices, seed=0):
+        """Create `devices` devices cycling through the supported types."""
+        self.plant_id = plant_id
+        self.devices = [
+            {
+                "deviceSn": f"{device_type[:3].upper()}{plant_id}{index:04d}",
+                "deviceType": device_type,
+                "deviceAilas": f"{device_type.title()} {index}",
+            }
+            for index, device_type in zip(range(devices), itertools.cycle(DEVICE_TYPES))
+        ]
+        self.rand = random.Random(seed)
+
+    def info(self, page_num=1, page_size=None):
+        """Return the getAllDeviceList payload with a page of the device list."""
+        devices = self.devices
+        if page_size is not None:
+            devices = devices[(page_num - 1) * page_size:page_num * page_size]
+        return {
+            "plantMoneyText": f"{self.rand.uniform(0, 20):.1f}/€",
+            "totalMoneyText": f"{self.rand.uniform(1000, 5000):.1f}",
+            "todayEnergy": f"{self.rand.uniform(0, 30):.1f}",
+            "invTodayPpv": f"{self.rand.uniform(0, 5000):.1f}",
+            "totalEnergy": f"{self.rand.uniform(1000, 40000):.1f}",
+            "nominalPower": 5000 * max(len(self.devices), 1),
+            "deviceList": devices,
+        }
+
+
+class MockGrowattServer:
+    """Threaded HTTP server emulating the Growatt cloud API.
+
+    `latency` seconds (plus up to `jitter`) are added to every request,
+    `error_rate` is the fraction of requests answered with an HTTP 500 error
+    page and sessions expire `session_ttl` seconds after logging in.
+    """
+
+    def __init__(
+        self,
+        plants=1,
+        devices=1,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        session_ttl=None,
+        host="127.0.0.1",
+        port=0,
+        seed=0,
+    ):
+        """Initialize the server, call start() to serve."""
+        self.plants = {
+            str(1000 + index): MockGrowattPlant(str(1000 + index), devices, seed + index)
+            for index in range(plants)
+        }
+        self.devices = {
+            device["deviceSn"]: (plant, device["deviceType"])
+            for plant in self.plants.values()
+            for device in plant.devices
+        }
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.rand = random.Random(seed)
+        self.requests = collections.Counter()
+        self.logins = 0
+        self.bytes_sent = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        """Return the base url to use as GrowattApi.server_url."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def total_requests(self):
+        """Return the number of requests served so far."""
+        with self._lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def expire_sessions(self):
+        """Expire every session, the next request of each client is redirected."""
+        with self._lock:
+            self._sessions.clear()
+
+    def reset_counters(self):
+        """Reset the request counters."""
+        with self._lock:
+            self.requests.clear()
+            self.logins = 0
+            self.bytes_sent = 0
+
+    def _login(self):
+        """Create a session and return its cookie value."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = time.monotonic()
+            self.logins += 1
+        return session_id
+
+    def _session_valid(self, session_id):
+        """Return whether a session cookie belongs to a live session."""
+        with self._lock:
+            started = self._sessions.get(session_id)
+        if started is None:
+            return False
+        if self.session_ttl is not None and time.monotonic() - started > self.session_ttl:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+            return False
+        return True
+
+    def _response(self, page, query, form):
+        """Return the payload for an authenticated API request."""
+        op = query.get("op", form.get("op"))
+        if page == "PlantListAPI.do":
+            data = [{"plantId": plant_id, "plantName": f"Plant {plant_id}"} for plant_id in self.plants]
+            return {"back": {"success": True, "data": data}}
+        if page == "PlantDetailAPI.do":
+            return {"back": {"success": True, "plantData": {}, "data": {}}}
+        if page == "newTwoPlantAPI.do" and op == "getAllDeviceList":
+            plant = self.plants.get(query.get("plantId"))
+            if plant is None:
+                return None
+            return plant.info(int(query.get("pageNum", 1)), int(query.get("pageSize", 1)))
+
+        serial = (
+            query.get("inverterId")
+            or query.get("id")
+            or query.get("storageId")
+            or query.get("storageSn")
+            or query.get("mixId")
+            or form.get("mixId")
+        )
+        if serial not in self.devices:
+            return None
+        plant, _ = self.devices[serial]
+        rand = plant.rand
+        handlers = {
+            ("newInverterAPI.do", "getInverterDetailData"): inverter_detail,
+            ("newInverterAPI.do", "getInverterDetailData_two"): inverter_detail,
+            ("newTlxApi.do", "getTlxDetailData"): tlx_detail,
+            ("newMixApi.do", "getSystemStatus_KW"): mix_status,
+            ("newMixApi.do", "getMixInfo"): mix_status,
+            ("newStorageAPI.do", "getStorageParams_sacolar"): storage_params,
+            ("newStorageAPI.do", "getStorageInfo_sacolar"): storage_params,
+            ("newStorageAPI.do", "getEnergyOverviewData_sacolar"): storage_energy_overview,
+        }
+        if (page, op) in (("newInverterAPI.do", "getInverterData"), ("newTlxApi.do", "getTlxData")):
+            return day_curve(rand, query.get("date"))
+        handler = handlers.get((page, op))
+        return handler(rand, serial) if handler is not None else None
+
+    def _handler(self):
+        """Return the request handler class bound to this server."""
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                """Keep benchmark output clean."""
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _send(self, status, body, content_type, headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for header in headers:
+                    self.send_header(*header)
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def _handle(self):
+                url = urllib.parse.urlsplit(self.path)
+                page = url.path.lstrip("/")
+                query = dict(urllib.parse.parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+                with server._lock:
+                    server.requests[(page, query.get("op", form.get("op")))] += 1
+
+                delay = server.latency + server.rand.uniform(0, server.jitter)
+                if delay:
+                    time.sleep(delay)
+
+                if page == "login.html":
+                    self._send(200, b"<html><body>Login</body></html>", "text/html")
+                    return
+                if server.error_rate and server.rand.random() < server.error_rate:
+                    self._send(500, b"<html><body>Error</body></html>", "text/html")
+                    return
+                if page == "LoginAPI.do":
+                    body = {"back": {"success": True, "userId": "42", "user": {"id": 42}}}
+                    cookie = f"JSESSIONID={server._login()}; Path=/"
+                    self._send(200, json.dumps(body).encode(), "application/json",
+                               [("Set-Cookie", cookie)])
+                    return
+
+                cookies = http.cookies.SimpleCookie(self.headers.get("Cookie", ""))
+                session = cookies.get("JSESSIONID")
+                if session is None or not server._session_valid(session.value):
+                    self._send(302, b"", "text/html", [("Location", "/login.html")])
+                    return
+
+                payload = server._response(page, query, form)
+                if payload is None:
+                    self._send(404, b"<html><body>Not found</body></html>", "text/html")
+                    return
+                self._send(200, json.dumps(payload).encode(), "application/json;charset=UTF-8")
+
+        return Handler
+
+
+def main():
+    """Serve a synthetic plant until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--plants", type=int, default=1)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--session-ttl", type=float, default=None)
+    args = parser.parse_args()
+
+    server = MockGrowattServer(
+        plants=args.plants,
+        devices=args.devices,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        session_ttl=args.session_ttl,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving {args.plants} plant(s) of {args.devices} device(s) on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
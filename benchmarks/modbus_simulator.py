@@ -0,0 +1,179 @@
+"""Local Modbus TCP simulator of Growatt devices.
+
+Every simulated device is a unit id answering "read input registers" from a
+register bank filled with synthetic values for the register map of its type
+in modbus.py. Other function codes, unknown units and reads over 125
+registers get Modbus exceptions. Requests are counted per unit, and
+`latency` seconds are added to each one.
+
+Run it on its own with:
+
+    python benchmarks/modbus_simulator.py --port 5020 --devices inverter tlx mix storage
+
+and point the `modbus` option at it, unit ids count up from 1.
+"""
+import argparse
+import collections
+import importlib.util
+import pathlib
+import random
+import socketserver
+import struct
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def load_modbus():
+    """Import modbus.py of this checkout, it does not need Home Assistant."""
+    spec = importlib.util.spec_from_file_location("growatt_modbus", ROOT / "modbus.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def register_bank(modbus, device_type, rand):
+    """Return synthetic {address: word} input registers of a device type."""
+    bank = {}
+    for register in modbus.REGISTERS_BY_DEVICE_TYPE[device_type]:
+        if register.signed:
+            raw = rand.randint(-100, 600) & 0xFFFF
+        elif register.words == 2:
+            raw = rand.randint(0, 60000)
+        else:
+            raw = rand.randint(0, 5000)
+        if register.words == 2:
+            bank[register.address] = raw >> 16
+            bank[register.address + 1] = raw & 0xFFFF
+        else:
+            bank[register.address] = raw
+    return bank
+
+
+class ModbusSimulator:
+    """Threaded Modbus TCP server with one unit per simulated device."""
+
+    def __init__(self, device_types, latency=0.0, host="127.0.0.1", port=0, seed=0):
+        """Initialize the server with units 1.. of `device_types`, call start() to serve."""
+        self.modbus = load_modbus()
+        rand = random.Random(seed)
+        self.device_types = {
+            unit: device_type for unit, device_type in enumerate(device_types, 1)
+        }
+        self.banks = {
+            unit: register_bank(self.modbus, device_type, rand)
+            for unit, device_type in self.device_types.items()
+        }
+        self.latency = latency
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        """Return the (host, port) the simulator listens on."""
+        return self.server.server_address[:2]
+
+    @property
+    def total_requests(self):
+        """Return the number of requests served so far."""
+        with self._lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def answer(self, unit, pdu):
+        """Return the response PDU of a request PDU to `unit`."""
+        function = pdu[0]
+        bank = self.banks.get(unit)
+        if bank is None:
+            # Gateway target device failed to respond.
+            return bytes((function | 0x80, 0x0B))
+        if function != self.modbus.READ_INPUT_REGISTERS:
+            return bytes((function | 0x80, 0x01))
+        address, count = struct.unpack(">HH", pdu[1:5])
+        if not 1 <= count <= self.modbus.MAX_READ:
+            return bytes((function | 0x80, 0x03))
+        with self._lock:
+            self.requests[unit] += 1
+        words = [bank.get(address + offset, 0) for offset in range(count)]
+        return struct.pack(f">BB{count}H", function, 2 * count, *words)
+
+    def _handler(self):
+        """Return the request handler class bound to this simulator."""
+        simulator = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            """Answer Modbus TCP frames until the client disconnects."""
+
+            def _receive(self, size):
+                data = b""
+                while len(data) < size:
+                    chunk = self.request.recv(size - len(data))
+                    if not chunk:
+                        return None
+                    data += chunk
+                return data
+
+            def handle(self):
+                while True:
+                    header = self._receive(7)
+                    if header is None:
+                        return
+                    transaction, _, length, unit = struct.unpack(">HHHB", header)
+                    pdu = self._receive(length - 1)
+                    if pdu is None:
+                        return
+                    if simulator.latency:
+                        time.sleep(simulator.latency)
+                    answer = simulator.answer(unit, pdu)
+                    self.request.sendall(
+                        struct.pack(">HHHB", transaction, 0, len(answer) + 1, unit) + answer
+                    )
+
+        return Handler
+
+
+def main():
+    """Serve simulated devices until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument(
+        "--devices", nargs="+", default=["inverter", "tlx", "mix", "storage"]
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    simulator = ModbusSimulator(
+        args.devices, latency=args.latency, host=args.host, port=args.port
+    )
+    host, port = simulator.address
+    for unit, device_type in simulator.device_types.items():
+        print(f"Unit {unit}: {device_type} on {host}:{port}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
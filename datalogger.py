@@ -0,0 +1,296 @@
+"""Receive the frames Growatt dataloggers push, as their server or as a proxy.
+
+ShineWiFi and ShineLAN dataloggers connect to server.growatt.com on port 5279
+and push the input registers of their inverter every few minutes. Pointed at
+Home Assistant instead, DataloggerReceiver decodes these frames as they
+stream in and hands the register blocks of every data record to a callback.
+It either answers the datalogger itself, or forwards the byte stream both
+ways unchanged to the Growatt server so the cloud keeps working.
+
+Frames start with a Modbus TCP like header: transaction, protocol (5 or 6),
+length of what follows, unit and function. The payload is XOR scrambled
+with "Growatt" and protocol 6 frames end with a CRC16. Data records carry
+the datalogger and inverter serials, a timestamp (protocol 6) and blocks of
+registers as start, end and the register values. This layout follows the
+community decodings of the protocol, frames that don't match are skipped.
+"""
+import asyncio
+import collections
+import datetime
+import logging
+import struct
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5279
+SCRAMBLE_KEY = b"Growatt"
+PROTOCOLS = (5, 6)
+HEADER_SIZE = 8
+# Larger frames are taken for garbage and skipped byte by byte.
+MAX_FRAME = 4096
+
+FUNCTION_ANNOUNCE = 0x03
+FUNCTION_DATA = 0x04
+FUNCTION_PING = 0x16
+FUNCTION_BUFFERED_DATA = 0x50
+DATA_FUNCTIONS = (FUNCTION_DATA, FUNCTION_BUFFERED_DATA)
+
+# Size of the serial fields and of the timestamp of a data record, by protocol.
+SERIAL_SIZE = {5: 10, 6: 30}
+TIMESTAMP_SIZE = {5: 0, 6: 7}
+
+Frame = collections.namedtuple(
+    "Frame", ("transaction", "protocol", "unit", "function", "payload", "raw")
+)
+Record = collections.namedtuple(
+    "Record", ("datalogger_serial", "serial", "timestamp", "blocks", "buffered")
+)
+
+
+def _crc_table():
+    """Return the lookup table of the Modbus CRC16."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(data):
+    """Return the Modbus CRC16 of `data`."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def scramble(payload):
+    """XOR a payload with the scramble key, which also unscrambles it."""
+    key = SCRAMBLE_KEY
+    return bytes(byte ^ key[index % len(key)] for index, byte in enumerate(payload))
+
+
+def encode_frame(transaction, protocol, unit, function, payload):
+    """Return the bytes of a frame with an unscrambled `payload`."""
+    frame = struct.pack(
+        ">HHHBB", transaction, protocol, len(payload) + 2, unit, function
+    ) + scramble(payload)
+    if protocol == 6:
+        frame += struct.pack(">H", crc16(frame))
+    return frame
+
+
+class FrameDecoder:
+    """Split a byte stream into frames as it arrives.
+
+    Bytes are buffered until a frame is complete, anything that doesn't start
+    like a frame is skipped up to the next plausible header.
+    """
+
+    def __init__(self):
+        """Initialize with an empty buffer."""
+        self._buffer = bytearray()
+        self.skipped = 0
+
+    def feed(self, data):
+        """Add received bytes and return the frames they complete."""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        while len(buffer) >= HEADER_SIZE:
+            transaction, protocol, length, unit, function = struct.unpack_from(
+                ">HHHBB", buffer
+            )
+            size = 6 + length + (2 if protocol == 6 else 0)
+            if protocol not in PROTOCOLS or length < 2 or size > MAX_FRAME:
+                del buffer[0]
+                self.skipped += 1
+                continue
+            if len(buffer) < size:
+                break
+            raw = bytes(buffer[:size])
+            del buffer[:size]
+            if protocol == 6 and crc16(raw[:-2]) != struct.unpack(">H", raw[-2:])[0]:
+                _LOGGER.debug("Skipping frame %d with a bad CRC", transaction)
+                self.skipped += size
+                continue
+            frames.append(
+                Frame(
+                    transaction,
+                    protocol,
+                    unit,
+                    function,
+                    scramble(raw[HEADER_SIZE : 6 + length]),
+                    raw,
+                )
+            )
+        return frames
+
+
+def _serial(field):
+    """Return the text of a zero padded serial field."""
+    return field.rstrip(b"\0 ").decode("ascii", "replace")
+
+
+def parse_record(frame):
+    """Return the Record of a data frame, None if it doesn't hold one."""
+    serial_size = SERIAL_SIZE[frame.protocol]
+    timestamp_size = TIMESTAMP_SIZE[frame.protocol]
+    payload = frame.payload
+    offset = 2 * serial_size + timestamp_size
+    if len(payload) < offset:
+        return None
+    timestamp = None
+    if timestamp_size:
+        year, month, day, hour, minute, second = payload[2 * serial_size : offset - 1]
+        try:
+            timestamp = datetime.datetime(2000 + year, month, day, hour, minute, second)
+        except ValueError:
+            pass
+    blocks = []
+    while offset + 4 <= len(payload):
+        start, end = struct.unpack_from(">HH", payload, offset)
+        count = end - start + 1
+        offset += 4
+        if count < 1 or offset + 2 * count > len(payload):
+            _LOGGER.debug("Skipping a malformed register block at %d", start)
+            break
+        blocks.append((start, struct.unpack_from(f">{count}H", payload, offset)))
+        offset += 2 * count
+    return Record(
+        _serial(payload[:serial_size]),
+        _serial(payload[serial_size : 2 * serial_size]),
+        timestamp,
+        blocks,
+        frame.function == FUNCTION_BUFFERED_DATA,
+    )
+
+
+def encode_record(protocol, datalogger_serial, serial, blocks, timestamp=None):
+    """Return the payload of a data record, the inverse of parse_record()."""
+    serial_size = SERIAL_SIZE[protocol]
+    payload = datalogger_serial.encode().ljust(serial_size, b"\0")
+    payload += serial.encode().ljust(serial_size, b"\0")
+    if TIMESTAMP_SIZE[protocol]:
+        timestamp = timestamp or datetime.datetime.now()
+        payload += bytes(
+            (
+                timestamp.year - 2000,
+                timestamp.month,
+                timestamp.day,
+                timestamp.hour,
+                timestamp.minute,
+                timestamp.second,
+                0,
+            )
+        )
+    for start, words in blocks:
+        payload += struct.pack(f">HH{len(words)}H", start, start + len(words) - 1, *words)
+    return payload
+
+
+def acknowledgement(frame):
+    """Return what the server answers to a frame: pings are echoed, others acked."""
+    if frame.function == FUNCTION_PING:
+        return frame.raw
+    return encode_frame(frame.transaction, frame.protocol, frame.unit, frame.function, b"\0")
+
+
+class DataloggerReceiver:
+    """Asyncio TCP server for dataloggers, calling `on_record` with every Record.
+
+    With `forward` set to (host, port) every connection is relayed to that
+    server byte for byte and the server's answers go back to the datalogger,
+    otherwise the receiver acknowledges the frames itself.
+    """
+
+    def __init__(self, on_record, host="0.0.0.0", port=DEFAULT_PORT, forward=None):
+        """Initialize the receiver, call start() to listen."""
+        self.on_record = on_record
+        self.host = host
+        self.port = port
+        self.forward = forward
+        self.frames = 0
+        self._server = None
+        # Handler task of every open connection, by writer.
+        self._connections = {}
+
+    async def start(self):
+        """Start listening."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self, *_):
+        """Stop listening and close every connection."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        handlers = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        if handlers:
+            await asyncio.wait(handlers)
+
+    async def _relay(self, reader, writer):
+        """Copy bytes from `reader` to `writer` until either side closes."""
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        """Decode the frames of one datalogger connection."""
+        peer = writer.get_extra_info("peername")
+        _LOGGER.debug("Datalogger connected from %s", peer)
+        self._connections[writer] = asyncio.current_task()
+        upstream = relay = None
+        try:
+            if self.forward is not None:
+                upstream_reader, upstream = await asyncio.open_connection(*self.forward)
+                relay = asyncio.create_task(self._relay(upstream_reader, writer))
+            decoder = FrameDecoder()
+            while data := await reader.read(65536):
+                if upstream is not None:
+                    # Forward first, decoding never delays the Growatt server.
+                    upstream.write(data)
+                for frame in decoder.feed(data):
+                    self.frames += 1
+                    self._frame(frame)
+                    if upstream is None:
+                        writer.write(acknowledgement(frame))
+                if upstream is not None:
+                    await upstream.drain()
+                else:
+                    await writer.drain()
+        except (ConnectionError, OSError) as err:
+            _LOGGER.debug("Datalogger connection from %s lost: %s", peer, err)
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+            if upstream is not None:
+                upstream.close()
+            if relay is not None:
+                relay.cancel()
+
+    def _frame(self, frame):
+        """Pass the record of a data frame to the callback."""
+        if frame.function not in DATA_FUNCTIONS:
+            return
+        record = parse_record(frame)
+        if record is None:
+            return
+        try:
+            self.on_record(record)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error handling the record of %s", record.serial)
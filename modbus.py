@@ -0,0 +1,375 @@
+"""Read Growatt devices locally over Modbus TCP instead of the Growatt server.
+
+GrowattModbusApi answers the calls the probes make to the cloud client, with
+payloads of the same shape built from the input registers of each device.
+The registers of a device type are read in as few requests as possible: they
+are sorted once and grouped into contiguous reads, bridging small gaps.
+
+The register maps follow Growatt's public Modbus protocol documents for each
+family (legacy inverters, MIN/TL-X, SPH mix and SPF storage). Firmware
+versions differ, check the values against the device or the cloud.
+"""
+import collections
+import logging
+import socket
+import struct
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PORT = 502
+DEFAULT_TIMEOUT = 5.0
+
+READ_INPUT_REGISTERS = 0x04
+# A Modbus read returns at most 125 registers.
+MAX_READ = 125
+# Reading this many unused registers costs less than another round trip.
+MAX_GAP = 32
+
+Register = collections.namedtuple(
+    "Register", ("key", "address", "words", "scale", "signed"), defaults=(1, 1, False)
+)
+
+# Input registers by register map, values are scaled to the units of the
+# api data of the cloud, power of mix devices is in kW.
+INVERTER_REGISTERS = (
+    Register("ppv", 1, 2, 0.1),
+    Register("vpv1", 3, 1, 0.1),
+    Register("ipv1", 4, 1, 0.1),
+    Register("ppv1", 5, 2, 0.1),
+    Register("vpv2", 7, 1, 0.1),
+    Register("ipv2", 8, 1, 0.1),
+    Register("ppv2", 9, 2, 0.1),
+    Register("pac", 11, 2, 0.1),
+    Register("fac", 13, 1, 0.01),
+    Register("vacr", 14, 1, 0.1),
+    Register("iacr", 15, 1, 0.1),
+    Register("pacr", 16, 2, 0.1),
+    Register("powerToday", 26, 2, 0.1),
+    Register("powerTotal", 28, 2, 0.1),
+    Register("temperature", 32, 1, 0.1, True),
+    Register("ipmTemperature", 41, 1, 0.1, True),
+)
+
+TLX_REGISTERS = (
+    Register("ppv", 3001, 2, 0.1),
+    Register("vpv1", 3003, 1, 0.1),
+    Register("ipv1", 3004, 1, 0.1),
+    Register("ppv1", 3005, 2, 0.1),
+    Register("vpv2", 3007, 1, 0.1),
+    Register("ipv2", 3008, 1, 0.1),
+    Register("ppv2", 3009, 2, 0.1),
+    Register("vpv3", 3011, 1, 0.1),
+    Register("ipv3", 3012, 1, 0.1),
+    Register("ppv3", 3013, 2, 0.1),
+    Register("pac", 3023, 2, 0.1),
+    Register("fac", 3025, 1, 0.01),
+    Register("vacr", 3026, 1, 0.1),
+    Register("iacr", 3027, 1, 0.1),
+    Register("pacr", 3028, 2, 0.1),
+    Register("eacToday", 3049, 2, 0.1),
+    Register("eacTotal", 3051, 2, 0.1),
+    Register("temp1", 3093, 1, 0.1, True),
+    Register("temp2", 3094, 1, 0.1, True),
+    Register("temp3", 3095, 1, 0.1, True),
+    Register("temp4", 3096, 1, 0.1, True),
+    Register("temp5", 3097, 1, 0.1, True),
+)
+
+MIX_REGISTERS = (
+    Register("ppv", 1, 2, 0.0001),
+    Register("vPv1", 3, 1, 0.1),
+    Register("pPv1", 5, 2, 0.0001),
+    Register("vPv2", 7, 1, 0.1),
+    Register("pPv2", 9, 2, 0.0001),
+    Register("pdisCharge1", 1009, 2, 0.0001),
+    Register("chargePower", 1011, 2, 0.0001),
+    Register("vBat", 1013, 1, 0.1),
+    Register("SOC", 1014, 1, 1),
+    Register("pactogrid", 1029, 2, 0.0001),
+    Register("pLocalLoad", 1037, 2, 0.0001),
+)
+
+STORAGE_PARAMS_REGISTERS = (
+    Register("vpv", 1, 1, 0.1),
+    Register("ppv", 3, 2, 0.1),
+    Register("iChargePV1", 7, 1, 0.1),
+    Register("outPutPower", 9, 2, 0.1),
+    Register("rateVA", 11, 2, 0.1),
+    Register("pCharge", 13, 2, 0.1),
+    Register("vBat", 17, 1, 0.01),
+    Register("capacity", 18, 1, 1),
+    Register("vGrid", 20, 1, 0.1),
+    Register("freqGrid", 21, 1, 0.01),
+    Register("outPutVolt", 22, 1, 0.1),
+    Register("freqOutPut", 23, 1, 0.01),
+    Register("loadPercent", 27, 1, 0.1),
+    Register("outPutCurrent", 34, 1, 0.1),
+    Register("pAcInPut", 36, 2, 0.1),
+)
+
+STORAGE_ENERGY_REGISTERS = (
+    Register("eChargeToday", 56, 2, 0.1),
+    Register("eChargeTotal", 58, 2, 0.1),
+    Register("eBatDisChargeToday", 60, 2, 0.1),
+    Register("eBatDisChargeTotal", 62, 2, 0.1),
+    Register("eacDisChargeToday", 64, 2, 0.1),
+    Register("eacChargeToday", 68, 2, 0.1),
+    Register("eopDischrToday", 72, 2, 0.1),
+    Register("eopDischrTotal", 74, 2, 0.1),
+    Register("eToUserToday", 76, 2, 0.1),
+    Register("eToUserTotal", 78, 2, 0.1),
+)
+
+# Api keys summed into the plant totals, by device type: energy today, energy
+# total and output power in W.
+TOTAL_KEYS = {
+    "inverter": ("powerToday", "powerTotal", "pac"),
+    "tlx": ("eacToday", "eacTotal", "pac"),
+}
+
+
+class ModbusError(OSError):
+    """Raised when a device answers with a Modbus exception or a bad frame."""
+
+
+def batch_reads(registers, max_gap=MAX_GAP, max_read=MAX_READ):
+    """Group registers into reads of contiguous ranges.
+
+    Returns (start, count, registers) tuples covering every register, gaps of
+    up to `max_gap` unused registers are read through.
+    """
+    batches = []
+    for register in sorted(registers, key=lambda register: register.address):
+        end = register.address + register.words
+        if batches:
+            start, count, members = batches[-1]
+            if (
+                register.address - (start + count) <= max_gap
+                and end - start <= max_read
+            ):
+                batches[-1] = (start, max(count, end - start), members + [register])
+                continue
+        batches.append((register.address, register.words, [register]))
+    return [(start, count, tuple(members)) for start, count, members in batches]
+
+
+def decode(registers, start, words):
+    """Return the api values of `registers` from the `words` read from `start`."""
+    values = {}
+    for register in registers:
+        offset = register.address - start
+        raw = words[offset]
+        if register.words == 2:
+            raw = raw << 16 | words[offset + 1]
+        if register.signed and raw >= 1 << (16 * register.words - 1):
+            raw -= 1 << (16 * register.words)
+        values[register.key] = round(raw * register.scale, 4)
+    return values
+
+
+def decode_blocks(registers, blocks):
+    """Return the api values of the `registers` held by (start, words) blocks.
+
+    Registers that don't lie wholly inside one of the blocks are left out.
+    """
+    values = {}
+    for start, words in blocks:
+        end = start + len(words)
+        values.update(
+            decode(
+                [
+                    register
+                    for register in registers
+                    if start <= register.address
+                    and register.address + register.words <= end
+                ],
+                start,
+                words,
+            )
+        )
+    return values
+
+
+class ModbusTcpClient:
+    """Minimal Modbus TCP client reading input registers, safe across threads.
+
+    The connection is opened on the first read and dropped after any error,
+    the next read opens a new one.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+        """Initialize the client without connecting."""
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._socket = None
+        self._transaction = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the connection."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        """Close the connection, the lock must be held."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _receive(self, size):
+        """Read exactly `size` bytes."""
+        data = b""
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError(f"{self.host}:{self.port} closed the connection")
+            data += chunk
+        return data
+
+    def read_input_registers(self, unit, address, count):
+        """Return `count` input registers of `unit` from `address`."""
+        with self._lock:
+            try:
+                return self._read(unit, READ_INPUT_REGISTERS, address, count)
+            except OSError:
+                self._close()
+                raise
+
+    def _read(self, unit, function, address, count):
+        """Send a read request and return the registers of the answer."""
+        if self._socket is None:
+            self._socket = socket.create_connection(
+                (self.host, self.port), timeout=self.timeout
+            )
+        self._transaction = (self._transaction + 1) & 0xFFFF
+        # MBAP header (transaction, protocol, length, unit) and the request PDU.
+        self._socket.sendall(
+            struct.pack(">HHHBBHH", self._transaction, 0, 6, unit, function, address, count)
+        )
+        transaction, protocol, length, _ = struct.unpack(">HHHB", self._receive(7))
+        pdu = self._receive(length - 1)
+        if transaction != self._transaction or protocol != 0:
+            raise ModbusError(f"Unexpected answer from {self.host}:{self.port}")
+        if pdu[0] == function | 0x80:
+            raise ModbusError(
+                f"Unit {unit} at {self.host}:{self.port} answered exception {pdu[1]}"
+                f" reading {count} registers from {address}"
+            )
+        if pdu[0] != function or pdu[1] != 2 * count or len(pdu) != 2 + 2 * count:
+            raise ModbusError(f"Malformed answer from {self.host}:{self.port}")
+        return struct.unpack(f">{count}H", pdu[2:])
+
+
+ModbusDevice = collections.namedtuple(
+    "ModbusDevice", ("serial", "device_type", "host", "port", "unit")
+)
+
+
+class GrowattModbusApi:
+    """Client reading local devices, with the methods probes call on GrowattApi.
+
+    Devices behind the same host and port share one connection. The plant
+    totals are summed from the last readings of the inverter and TL-X
+    devices.
+    """
+
+    def __init__(self, devices, timeout=DEFAULT_TIMEOUT):
+        """Initialize the client for an iterable of ModbusDevice."""
+        self.devices = {device.serial: device for device in devices}
+        self.timeout = timeout
+        self.telemetry = None
+        self._clients = {}
+        self._readings = {}
+
+    def _client(self, device):
+        """Return the connection to the host of a device."""
+        key = (device.host, device.port)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients.setdefault(
+                key, ModbusTcpClient(device.host, device.port, self.timeout)
+            )
+        return client
+
+    def read(self, serial, batches):
+        """Read the registers of compiled `batches` from a device into api data."""
+        device = self.devices[serial]
+        client = self._client(device)
+        values = {}
+        for start, count, registers in batches:
+            started = time.monotonic()
+            words = client.read_input_registers(device.unit, start, count)
+            if self.telemetry is not None:
+                self.telemetry.record(
+                    f"modbus {device.host} {start}+{count}",
+                    time.monotonic() - started,
+                    9 + 2 * count,
+                )
+            values.update(decode(registers, start, words))
+        self._readings.setdefault(serial, {}).update(values)
+        return values
+
+    def remember(self, serial, values):
+        """Keep api values of a device received otherwise for the plant totals."""
+        self._readings.setdefault(serial, {}).update(values)
+
+    def close(self):
+        """Close every connection."""
+        for client in self._clients.values():
+            client.close()
+
+    def inverter_detail(self, inverter_id):
+        """Return the api data of an inverter."""
+        return self.read(inverter_id, INVERTER_BATCHES)
+
+    def tlx_detail(self, tlx_id):
+        """Return the api data of a TL-X inverter, shaped like the cloud's."""
+        return {"data": self.read(tlx_id, TLX_BATCHES)}
+
+    def mix_info2(self, mix_id, plant_id):
+        """Return the api data of a mix device, shaped like the cloud's."""
+        return {"obj": self.read(mix_id, MIX_BATCHES)}
+
+    def storage_params(self, storage_id):
+        """Return the parameters of a storage device, shaped like the cloud's."""
+        return {"storageDetailBean": self.read(storage_id, STORAGE_PARAMS_BATCHES)}
+
+    def storage_energy_overview(self, plant_id, storage_id):
+        """Return the energy overview of a storage device."""
+        return self.read(storage_id, STORAGE_ENERGY_BATCHES)
+
+    def plant_info(self, plant_id):
+        """Return plant totals summed from the last readings of the devices."""
+        today = total = power = 0.0
+        for serial, readings in self._readings.items():
+            keys = TOTAL_KEYS.get(self.devices[serial].device_type)
+            if keys is None:
+                continue
+            today += readings.get(keys[0], 0)
+            total += readings.get(keys[1], 0)
+            power += readings.get(keys[2], 0)
+        return {
+            "todayEnergy": round(today, 1),
+            "totalEnergy": round(total, 1),
+            "invTodayPpv": round(power, 1),
+            "plantMoneyText": "",
+            "totalMoneyText": "",
+        }
+
+
+INVERTER_BATCHES = batch_reads(INVERTER_REGISTERS)
+TLX_BATCHES = batch_reads(TLX_REGISTERS)
+MIX_BATCHES = batch_reads(MIX_REGISTERS)
+STORAGE_PARAMS_BATCHES = batch_reads(STORAGE_PARAMS_REGISTERS)
+STORAGE_ENERGY_BATCHES = batch_reads(STORAGE_ENERGY_REGISTERS)
+
+# Register maps by device type, for simulators and diagnostics.
+REGISTERS_BY_DEVICE_TYPE = {
+    "inverter": INVERTER_REGISTERS,
+    "tlx": TLX_REGISTERS,
+    "mix": MIX_REGISTERS,
+    "storage": STORAGE_PARAMS_REGISTERS + STORAGE_ENERGY_REGISTERS,
+}
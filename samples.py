@@ -0,0 +1,58 @@
+"""Fixed memory buffers of sensor samples."""
+from array import array
+
+
+class RollingWindow:
+    """Min, max and mean of the samples of the last `span` seconds.
+
+    The window is cut into `buckets` buckets of equal width, each holding the
+    min, max, sum and count of its samples in preallocated arrays. Adding a
+    sample updates one bucket and a bucket is reused once its slot leaves the
+    window, so the memory is fixed and the window moves in steps of a bucket.
+    """
+
+    __slots__ = ("width", "slots", "mins", "maxs", "sums", "counts")
+
+    def __init__(self, span, buckets):
+        """Initialize an empty window of `span` seconds."""
+        self.width = span / buckets
+        self.slots = array("q", [-1]) * buckets
+        self.mins = array("d", bytes(8 * buckets))
+        self.maxs = array("d", bytes(8 * buckets))
+        self.sums = array("d", bytes(8 * buckets))
+        self.counts = array("L", bytes(array("L").itemsize * buckets))
+
+    def add(self, time, value):
+        """Add the sample `value` taken at `time`, in seconds since the epoch."""
+        slot = int(time // self.width)
+        index = slot % len(self.slots)
+        if self.slots[index] != slot:
+            self.slots[index] = slot
+            self.mins[index] = self.maxs[index] = self.sums[index] = value
+            self.counts[index] = 1
+            return
+        if value < self.mins[index]:
+            self.mins[index] = value
+        if value > self.maxs[index]:
+            self.maxs[index] = value
+        self.sums[index] += value
+        self.counts[index] += 1
+
+    def stats(self, now):
+        """Return the (min, max, mean) of the window ending at `now`, None if empty."""
+        first = int(now // self.width) - len(self.slots) + 1
+        low = high = None
+        total = 0.0
+        count = 0
+        for index, slot in enumerate(self.slots):
+            if slot < first:
+                continue
+            if low is None or self.mins[index] < low:
+                low = self.mins[index]
+            if high is None or self.maxs[index] > high:
+                high = self.maxs[index]
+            total += self.sums[index]
+            count += self.counts[index]
+        if not count:
+            return None
+        return low, high, total / count
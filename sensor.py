@@ -1,19 +1,44 @@
 """Read status of growatt inverters."""
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
 import datetime
 import json
 import logging
 import re
+import threading
+import time
 
 #import growattServer
+import aiohttp
 import voluptuous as vol
 
 #Growatt Server paste start
 
 from enum import IntEnum
 import hashlib
+import random
 import requests
 import warnings
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(content):
+    """
+    Decode a JSON response body straight from its bytes.
+
+    orjson (which Home Assistant ships) parses the bytes without building a
+    str copy first, the stdlib decoder is used when it is not installed. Both
+    raise json.decoder.JSONDecodeError on invalid input.
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
 def hash_password(password):
     """
     Normal MD5, except add c if a byte of the digest is less than 10.
@@ -24,6 +49,236 @@ def hash_password(password):
             password_md5 = password_md5[0:i] + 'c' + password_md5[i + 1:]
     return password_md5
 
+# Devices are listed in pages of this size, several pages at a time.
+DEVICE_LIST_PAGE_SIZE = 100
+DEVICE_LIST_PARALLEL_PAGES = 4
+# Seconds a device list is served from cache before it is refreshed, the
+# devices of the plants are rediscovered at this interval.
+DEVICE_LIST_TTL = 3600
+# Requests per second and burst allowed per account, shared by all its clients.
+REQUEST_RATE = 5.0
+REQUEST_BURST = 20
+# Failed requests are retried after a random delay of up to
+# BACKOFF_BASE * 2 ** attempt seconds, capped at BACKOFF_CAP.
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Seconds to wait for a connection and for data of a response.
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 30.0
+# Failed attempts in a row that open the circuit of an endpoint, and seconds
+# until a single call may try it again.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 300.0
+
+
+class GrowattRequestError(Exception):
+    """
+    The server answered with an unexpected HTTP status.
+    """
+
+
+class RequestBudgetExceeded(Exception):
+    """
+    The request budget of the current cycle is spent.
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    Calls to an endpoint are suspended after repeated failures.
+    """
+
+
+class SessionExpired(Exception):
+    """
+    A logged in request was not answered with JSON, the session has likely expired.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling an endpoint after `threshold` failed attempts in a row.
+
+    Once `cooldown` seconds have passed a single call is let through
+    (half-open), it closes the circuit again or restarts the cool-down.
+    """
+
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go through now.
+        """
+        with self._lock:
+            if self.opened is None:
+                return
+            if self._probing or time.monotonic() - self.opened < self.cooldown:
+                raise CircuitOpenError("%s is suspended after %d failures" % (self.name, self.failures))
+            self._probing = True
+
+    def success(self):
+        """
+        Close the circuit after a successful call.
+        """
+        with self._lock:
+            if self.opened is not None:
+                _LOGGER.info("%s is answering again", self.name)
+            self.failures = 0
+            self.opened = None
+            self._probing = False
+
+    def failure(self):
+        """
+        Count a failed attempt, open the circuit at the threshold.
+        """
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                if self.opened is None:
+                    _LOGGER.warning("%s failed %d times, suspending calls for %ds",
+                                    self.name, self.failures, self.cooldown)
+                self.opened = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """
+        Let another call probe after one ended without an outcome.
+        """
+        with self._lock:
+            self._probing = False
+
+
+def request_key(method, page, kwargs):
+    """
+    Return a hashable key of a request, identical requests get the same key.
+    """
+    return (method, page) + tuple(
+        (name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+        for name, value in sorted(kwargs.items()))
+
+
+def endpoint_name(page, params=None):
+    """
+    Return the name of an endpoint, the page with its 'op' parameter.
+    """
+    op = (params or {}).get('op')
+    return '%s?op=%s' % (page, op) if op else page
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every client of an account.
+
+    The rate is halved whenever a request has to be retried and creeps back up
+    to `max_rate` with every success, so it settles just below the rate the
+    server tolerates instead of running into a ban.
+    """
+
+    def __init__(self, max_rate, burst):
+        self.max_rate = max_rate
+        self.min_rate = max_rate / 32
+        self.rate = max_rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return the seconds to wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going into debt queues callers behind each other.
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def throttle(self):
+        """
+        Halve the rate after a failed request.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        """
+        Raise the rate a little after a successful request.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def rate_limiter(username, max_rate=REQUEST_RATE, burst=REQUEST_BURST):
+    """
+    Return the rate limiter of an account, the first caller sets its rate.
+    """
+    with _rate_limiters_lock:
+        if username not in _rate_limiters:
+            _rate_limiters[username] = RateLimiter(max_rate, burst)
+        return _rate_limiters[username]
+
+
+def backoff_delay(attempt):
+    """
+    Return a random delay before retry number `attempt` (from 0).
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class RequestBudget:
+    """
+    Number of requests a cycle may send, None for no limit.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def spend(self):
+        """
+        Count a request, raise RequestBudgetExceeded if none are left.
+        """
+        with self._lock:
+            if self.limit is not None and self.used >= self.limit:
+                self.denied += 1
+                raise RequestBudgetExceeded()
+            self.used += 1
+
+
+# Budget of the cycle making the requests, copied into its worker threads.
+request_budget = contextvars.ContextVar('growatt_request_budget', default=None)
+
+
+def merge_devices(devices, page):
+    """
+    Add the devices of a page to `devices` by serial, return how many were new.
+    """
+    new = 0
+    for device in page:
+        if device['deviceSn'] not in devices:
+            devices[device['deviceSn']] = device
+            new += 1
+    return new
+
+
 class Timespan(IntEnum):
     day = 1
     month = 2
@@ -32,8 +287,47 @@ class Timespan(IntEnum):
 class GrowattApi:
     server_url = 'http://server.growatt.com/'
 
-    def __init__(self):
+    def __init__(self, pool_maxsize=None, max_request_rate=REQUEST_RATE,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), telemetry=None):
         self.session = requests.Session()
+        self.timeout = timeout
+        self.telemetry = telemetry
+        self.pool_maxsize = None
+        self.adapter_factory = requests.adapters.HTTPAdapter
+        if pool_maxsize is not None:
+            self.grow_pool(pool_maxsize)
+        self.username = None
+        self.password_md5 = None
+        self.login_response = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.max_request_rate = max_request_rate
+        self.rate_limiter = None
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
+        self.device_list_ttl = DEVICE_LIST_TTL
+        self._device_lists = {}
+
+    def grow_pool(self, pool_maxsize):
+        """
+        Keep at least `pool_maxsize` connections, one per concurrent caller.
+        """
+        if self.pool_maxsize is not None and pool_maxsize <= self.pool_maxsize:
+            return
+        self.pool_maxsize = pool_maxsize
+        adapter = self.adapter_factory(pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def mount(self, adapter_factory):
+        """
+        Send all requests through adapters made by `adapter_factory(pool_maxsize=...)`.
+        """
+        self.adapter_factory = adapter_factory
+        pool_maxsize, self.pool_maxsize = self.pool_maxsize, None
+        self.grow_pool(pool_maxsize or requests.adapters.DEFAULT_POOLSIZE)
 
     def get_url(self, page):
         """
@@ -45,24 +339,208 @@ class GrowattApi:
         """
         Log the user in.
         """
-        password_md5 = hash_password(password)
-        response = self.session.post(self.get_url('LoginAPI.do'), data={
-            'userName': username,
-            'password': password_md5
-        })
-        data = json.loads(response.content.decode('utf-8'))
+        self.username = username
+        self.password_md5 = hash_password(password)
+        if self.max_request_rate is not None:
+            self.rate_limiter = rate_limiter(username, self.max_request_rate)
+        return self._login()
+
+    def ensure_login(self, username, password):
+        """
+        Log in unless the client already is, for clients shared by several callers.
+        """
+        with self._login_lock:
+            if (self.login_response is None or not self.login_response.get('success')
+                    or (self.username, self.password_md5) != (username, hash_password(password))):
+                self.login(username, password)
+            return self.login_response
+
+    def _login(self):
+        """
+        Log in with the stored credentials, the session keeps the cookie.
+        """
+        data = self._retrying('LoginAPI.do', self._login_once)
+        self._login_generation += 1
+        if self.telemetry is not None:
+            self.telemetry.record_login()
+        self.login_response = data['back']
         return data['back']
 
+    def _login_once(self):
+        """
+        Send the login request.
+        """
+        response = self._send('POST', 'LoginAPI.do', data={
+            'userName': self.username,
+            'password': self.password_md5
+        })
+        if response.status_code != 200:
+            raise GrowattRequestError("Login returned HTTP %s" % response.status_code)
+        return json_loads(response.content)
+
+    def _relogin(self, generation):
+        """
+        Log in again unless another caller already did since `generation`.
+
+        Returns whether the session is logged in again.
+        """
+        with self._login_lock:
+            if generation != self._login_generation:
+                return True
+            _LOGGER.debug("Growatt session expired, logging in again")
+            if not self._login().get('success'):
+                _LOGGER.error("Unable to log in to Growatt server again")
+                return False
+            return True
+
+    @staticmethod
+    def _decode(response):
+        """
+        Decode a JSON response, an expired session gets the login page instead.
+        """
+        if response.is_redirect:
+            raise json.decoder.JSONDecodeError(
+                "Redirected to %s" % response.headers.get('Location'), '', 0)
+        if response.status_code != 200:
+            raise GrowattRequestError("%s returned HTTP %s" % (response.url, response.status_code))
+        return json_loads(response.content)
+
+    def _send(self, method, page, **kwargs):
+        """
+        Send a request within the cycle's budget and the account's rate limit.
+        """
+        budget = request_budget.get()
+        if budget is not None:
+            budget.spend()
+        if self.rate_limiter is not None:
+            time.sleep(self.rate_limiter.reserve())
+        kwargs.setdefault('timeout', self.timeout)
+        if self.telemetry is None:
+            return self.session.request(method, self.get_url(page), **kwargs)
+        started = time.monotonic()
+        response = None
+        try:
+            response = self.session.request(method, self.get_url(page), **kwargs)
+            return response
+        finally:
+            self.telemetry.record(endpoint_name(page, kwargs.get('params')),
+                                  time.monotonic() - started,
+                                  len(response.content) if response is not None else 0)
+
+    def _request_once(self, method, page, **kwargs):
+        """
+        Perform a request, raising SessionExpired if a logged in one gets no JSON.
+        """
+        try:
+            return self._request_decoded(method, page, **kwargs)
+        except json.decoder.JSONDecodeError as err:
+            if self.password_md5 is None:
+                raise
+            raise SessionExpired(str(err)) from err
+
+    def _request_decoded(self, method, page, **kwargs):
+        """
+        Perform a request and decode its answer.
+        """
+        response = self._send(method, page, **kwargs)
+        return response, self._decode(response)
+
+    def _request_logged_in(self, endpoint, method, page, **kwargs):
+        """
+        Perform a request with retries, logging in again once if the session expired.
+
+        The login and the repeated request happen once per request, outside the
+        retries and their backoff. An answer that is still not JSON fails the
+        request right away.
+        """
+        generation = self._login_generation
+        try:
+            return self._retrying(endpoint, self._request_once, method, page, **kwargs)
+        except SessionExpired as err:
+            expired = err.__cause__
+        if not self._relogin(generation):
+            raise expired
+        return self._retrying(endpoint, self._request_decoded, method, page, retries=0, **kwargs)
+
+    def _request(self, method, page, **kwargs):
+        """
+        Perform a request, retrying failures with exponential backoff and jitter.
+
+        Callers making an identical request while one is in flight wait for it
+        and get the same result, which must therefore not be modified.
+        """
+        key = request_key(method, page, kwargs)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            endpoint = endpoint_name(page, kwargs.get('params'))
+            result = self._request_logged_in(endpoint, method, page, **kwargs)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def breaker(self, endpoint):
+        """
+        Return the circuit breaker of an endpoint.
+        """
+        with self._breakers_lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint)
+            return self.breakers[endpoint]
+
+    def _retrying(self, endpoint, call, *args, retries=MAX_RETRIES, **kwargs):
+        """
+        Call `call` until it succeeds, `retries` retries have failed or the
+        circuit of `endpoint` opens.
+        """
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = call(*args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    json.decoder.JSONDecodeError, GrowattRequestError) as err:
+                breaker.failure()
+                if self.telemetry is not None:
+                    self.telemetry.record_error(endpoint)
+                if attempt >= retries or breaker.opened is not None:
+                    raise
+                delay = backoff_delay(attempt)
+                _LOGGER.debug("Request failed (%s), retrying in %.1fs", err, delay)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.throttle()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.success()
+            if self.rate_limiter is not None:
+                self.rate_limiter.recover()
+            return result
+
     def plant_list(self, user_id):
         """
         Get a list of plants connected to this account.
         """
-        response = self.session.get(self.get_url('PlantListAPI.do'),
-                                    params={'userId': user_id},
-                                    allow_redirects=False)
+        response, data = self._request('GET', 'PlantListAPI.do',
+                                       params={'userId': user_id},
+                                       allow_redirects=False)
         if response.status_code != 200:
             raise RuntimeError("Request failed: %s", response)
-        data = json.loads(response.content.decode('utf-8'))
         return data['back']
 
     def plant_detail(self, plant_id, timespan, date):
@@ -75,12 +553,11 @@ class GrowattApi:
         elif timespan == Timespan.month:
             date_str = date.strftime('%Y-%m')
 
-        response = self.session.get(self.get_url('PlantDetailAPI.do'), params={
+        _, data = self._request('GET', 'PlantDetailAPI.do', params={
             'plantId': plant_id,
             'type': timespan.value,
             'date': date_str
         })
-        data = json.loads(response.content.decode('utf-8'))
         return data['back']
 
     def inverter_data(self, inverter_id, date):
@@ -90,37 +567,32 @@ class GrowattApi:
         if date is None:
             date = datetime.date.today()
         date_str = date.strftime('%Y-%m-%d')
-        response = self.session.get(self.get_url('newInverterAPI.do'), params={
+        _, data = self._request('GET', 'newInverterAPI.do', params={
             'op': 'getInverterData',
             'id': inverter_id,
             'type': 1,
             'date': date_str
         })
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def inverter_detail(self, inverter_id):
         """
         Get "All parameters" from PV inverter.
         """
-        response = self.session.get(self.get_url('newInverterAPI.do'), params={
+        _, data = self._request('GET', 'newInverterAPI.do', params={
             'op': 'getInverterDetailData',
             'inverterId': inverter_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def inverter_detail_two(self, inverter_id):
         """
         Get "All parameters" from PV inverter.
         """
-        response = self.session.get(self.get_url('newInverterAPI.do'), params={
+        _, data = self._request('GET', 'newInverterAPI.do', params={
             'op': 'getInverterDetailData_two',
             'inverterId': inverter_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def tlx_data(self, tlx_id, date):
@@ -130,37 +602,32 @@ class GrowattApi:
         if date is None:
             date = datetime.date.today()
         date_str = date.strftime('%Y-%m-%d')
-        response = self.session.get(self.get_url('newTlxApi.do'), params={
+        _, data = self._request('GET', 'newTlxApi.do', params={
             'op': 'getTlxData',
             'id': tlx_id,
             'type': 1,
             'date': date_str
         })
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def tlx_detail(self, tlx_id):
         """
         Get "All parameters" from PV inverter.
         """
-        response = self.session.get(self.get_url('newTlxApi.do'), params={
+        _, data = self._request('GET', 'newTlxApi.do', params={
             'op': 'getTlxDetailData',
             'id': tlx_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def mix_info(self, mix_id):
         """
         Get "All parameters" from Mix device.
         """
-        response = self.session.get(self.get_url('newMixApi.do'), params={
+        _, data = self._request('GET', 'newMixApi.do', params={
             'op': 'getMixInfo',
             'mixId': mix_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def mix_info2(self, mix_id, plant_id):
@@ -168,47 +635,39 @@ class GrowattApi:
         Get "All parameters" from Mix device.
         """
         payloadbody = {'mixId':mix_id,'plantId': plant_id}
-        response = self.session.post(self.get_url('newMixApi.do'), params={
+        _, data = self._request('POST', 'newMixApi.do', params={
             'op': 'getSystemStatus_KW'
         }, data=payloadbody)
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def storage_detail(self, storage_id):
         """
         Get "All parameters" from battery storage.
         """
-        response = self.session.get(self.get_url('newStorageAPI.do'), params={
+        _, data = self._request('GET', 'newStorageAPI.do', params={
             'op': 'getStorageInfo_sacolar',
             'storageId': storage_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def storage_params(self, storage_id):
         """
         Get much more detail from battery storage.
         """
-        response = self.session.get(self.get_url('newStorageAPI.do'), params={
+        _, data = self._request('GET', 'newStorageAPI.do', params={
             'op': 'getStorageParams_sacolar',
             'storageId': storage_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
     def storage_energy_overview(self, plant_id, storage_id):
         """
         Get some energy/generation overview data.
         """
-        response = self.session.post(self.get_url('newStorageAPI.do?op=getEnergyOverviewData_sacolar'), params={
+        _, data = self._request('POST', 'newStorageAPI.do?op=getEnergyOverviewData_sacolar', params={
             'plantId': plant_id,
             'storageSn': storage_id
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data['obj']
 
     def inverter_list(self, plant_id):
@@ -221,50 +680,588 @@ class GrowattApi:
     def device_list(self, plant_id):
         """
         Get a list of all devices connected to plant.
+
+        The list is cached for `device_list_ttl` seconds, so platform entries
+        sharing the client fetch it once.
         """
-        return self.plant_info(plant_id)['deviceList']
+        cached = self._device_lists.get(plant_id)
+        if cached is None or time.monotonic() - cached[0] > self.device_list_ttl:
+            return self.refresh_device_list(plant_id)
+        return list(cached[1])
 
-    def plant_info(self, plant_id):
+    def refresh_device_list(self, plant_id):
+        """
+        Fetch all pages of the device list of a plant and cache it.
         """
-        Get basic plant information with device list.
+        def fetch_page(page_num):
+            return self.plant_info(plant_id, page_num, DEVICE_LIST_PAGE_SIZE)['deviceList']
+
+        devices = {}
+        first_page = fetch_page(1)
+        merge_devices(devices, first_page)
+        # Stop at the first short page, or one without new devices in case the
+        # server ignores the paging and sends everything every time.
+        if len(first_page) >= DEVICE_LIST_PAGE_SIZE:
+            with ThreadPoolExecutor(max_workers=DEVICE_LIST_PARALLEL_PAGES) as executor:
+                page_num = 2
+                done = False
+                while not done:
+                    pages = executor.map(
+                        fetch_page, range(page_num, page_num + DEVICE_LIST_PARALLEL_PAGES))
+                    for page in pages:
+                        if not merge_devices(devices, page) or len(page) < DEVICE_LIST_PAGE_SIZE:
+                            done = True
+                            break
+                    page_num += DEVICE_LIST_PARALLEL_PAGES
+
+        self._device_lists[plant_id] = (time.monotonic(), list(devices.values()))
+        return list(devices.values())
+
+    def plant_info(self, plant_id, page_num=1, page_size=1):
         """
-        response = self.session.get(self.get_url('newTwoPlantAPI.do'), params={
+        Get basic plant information with (a page of) the device list.
+        """
+        _, data = self._request('GET', 'newTwoPlantAPI.do', params={
             'op': 'getAllDeviceList',
             'plantId': plant_id,
-            'pageNum': 1,
-            'pageSize': 1
+            'pageNum': page_num,
+            'pageSize': page_size
         })
-
-        data = json.loads(response.content.decode('utf-8'))
         return data
 
 ##Growatt Server paste end
 
 
+class AsyncGrowattApi:
+    """Asyncio counterpart of GrowattApi sharing a pooled aiohttp session."""
+
+    server_url = GrowattApi.server_url
+
+    def __init__(
+        self,
+        session,
+        max_request_rate=REQUEST_RATE,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        telemetry=None,
+    ):
+        """Initialize the client on a (shared) aiohttp ClientSession."""
+        self.session = session
+        self.telemetry = telemetry
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.username = None
+        self.password_md5 = None
+        self.max_request_rate = max_request_rate
+        self.rate_limiter = None
+        self.breakers = {}
+        self.login_response = None
+        self._inflight = {}
+        self._login_lock = asyncio.Lock()
+        self._login_generation = 0
+        self.device_list_ttl = DEVICE_LIST_TTL
+        self._device_lists = {}
+
+    def get_url(self, page):
+        """Get the page url."""
+        return self.server_url + page
+
+    async def login(self, username, password):
+        """Log the user in."""
+        self.username = username
+        self.password_md5 = hash_password(password)
+        self.rate_limiter = rate_limiter(username, self.max_request_rate)
+        return await self._login()
+
+    async def ensure_login(self, username, password):
+        """Log in unless the client already is, for clients shared by several callers."""
+        async with self._login_lock:
+            if (
+                self.login_response is None
+                or not self.login_response.get("success")
+                or (self.username, self.password_md5)
+                != (username, hash_password(password))
+            ):
+                await self.login(username, password)
+            return self.login_response
+
+    async def _login(self):
+        """Log in with the stored credentials, the session keeps the cookie."""
+        data = await self._retrying("LoginAPI.do", self._login_once)
+        self._login_generation += 1
+        if self.telemetry is not None:
+            self.telemetry.record_login()
+        self.login_response = data["back"]
+        return data["back"]
+
+    async def _login_once(self):
+        """Send the login request."""
+        status, body = await self._send(
+            "POST",
+            "LoginAPI.do",
+            data={"userName": self.username, "password": self.password_md5},
+        )
+        if status != 200:
+            raise GrowattRequestError(f"Login returned HTTP {status}")
+        return json_loads(body)
+
+    async def _relogin(self, generation):
+        """Log in again unless another caller did since `generation`, return if logged in."""
+        async with self._login_lock:
+            if generation != self._login_generation:
+                return True
+            _LOGGER.debug("Growatt session expired, logging in again")
+            if not (await self._login()).get("success"):
+                _LOGGER.error("Unable to log in to Growatt server again")
+                return False
+            return True
+
+    async def _wait_turn(self):
+        """Spend a request of the cycle's budget and wait for the rate limit."""
+        budget = request_budget.get()
+        if budget is not None:
+            budget.spend()
+        if self.rate_limiter is not None:
+            await asyncio.sleep(self.rate_limiter.reserve())
+
+    async def _send(self, method, page, **kwargs):
+        """Send a request and return its status and body, or Location if redirected."""
+        await self._wait_turn()
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.monotonic()
+        size = 0
+        try:
+            async with self.session.request(
+                method, self.get_url(page), **kwargs
+            ) as response:
+                if 300 <= response.status < 400:
+                    return response.status, response.headers.get("Location")
+                body = await response.read()
+                size = len(body)
+                return response.status, body
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record(
+                    endpoint_name(page, kwargs.get("params")),
+                    time.monotonic() - started,
+                    size,
+                )
+
+    async def _fetch(self, method, page, **kwargs):
+        """Perform a single request and decode its JSON body."""
+        status, body = await self._send(method, page, **kwargs)
+        if 300 <= status < 400:
+            raise json.decoder.JSONDecodeError(f"Redirected to {body}", "", 0)
+        if status != 200:
+            raise GrowattRequestError(f"{page} returned HTTP {status}")
+        return status, json_loads(body)
+
+    async def _request(self, method, page, **kwargs):
+        """Perform a request, merged with an identical one already in flight."""
+        key = request_key(method, page, kwargs)
+        task = self._inflight.get(key)
+        if task is None:
+            endpoint = endpoint_name(page, kwargs.get("params"))
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._request_logged_in(endpoint, method, page, **kwargs)
+            )
+
+            def done(task):
+                self._inflight.pop(key, None)
+                # Retrieved here in case every caller was cancelled meanwhile.
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(done)
+        # One caller giving up must not cancel the request of the others.
+        return await asyncio.shield(task)
+
+    def breaker(self, endpoint):
+        """Return the circuit breaker of an endpoint."""
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(endpoint)
+        return self.breakers[endpoint]
+
+    async def _retrying(self, endpoint, call, *args, retries=MAX_RETRIES, **kwargs):
+        """Await `call` until it succeeds, `retries` retries fail or the circuit opens."""
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = await call(*args, **kwargs)
+            except (
+                aiohttp.ClientConnectionError,
+                asyncio.TimeoutError,
+                json.decoder.JSONDecodeError,
+                GrowattRequestError,
+            ) as err:
+                breaker.failure()
+                if self.telemetry is not None:
+                    self.telemetry.record_error(endpoint)
+                if attempt >= retries or breaker.opened is not None:
+                    raise
+                delay = backoff_delay(attempt)
+                _LOGGER.debug("Request failed (%s), retrying in %.1fs", err, delay)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.throttle()
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.success()
+            if self.rate_limiter is not None:
+                self.rate_limiter.recover()
+            return result
+
+    async def _request_once(self, method, page, **kwargs):
+        """Perform a request, raising SessionExpired if a logged in one gets no JSON."""
+        try:
+            return await self._fetch(method, page, **kwargs)
+        except json.decoder.JSONDecodeError as err:
+            if self.password_md5 is None:
+                raise
+            raise SessionExpired(str(err)) from err
+
+    async def _request_logged_in(self, endpoint, method, page, **kwargs):
+        """Perform a request with retries, see GrowattApi._request_logged_in()."""
+        generation = self._login_generation
+        try:
+            return await self._retrying(
+                endpoint, self._request_once, method, page, **kwargs
+            )
+        except SessionExpired as err:
+            expired = err.__cause__
+        if not await self._relogin(generation):
+            raise expired
+        return await self._retrying(
+            endpoint, self._fetch, method, page, retries=0, **kwargs
+        )
+
+    async def plant_list(self, user_id):
+        """Get a list of plants connected to this account."""
+        status, data = await self._request(
+            "GET", "PlantListAPI.do", params={"userId": user_id}, allow_redirects=False
+        )
+        if status != 200:
+            raise RuntimeError("Request failed: %s", status)
+        return data["back"]
+
+    async def plant_detail(self, plant_id, timespan, date):
+        """Get plant details for specified timespan."""
+        assert timespan in Timespan
+        if timespan == Timespan.day:
+            date_str = date.strftime("%Y-%m-%d")
+        elif timespan == Timespan.month:
+            date_str = date.strftime("%Y-%m")
+        _, data = await self._request(
+            "GET",
+            "PlantDetailAPI.do",
+            params={"plantId": plant_id, "type": timespan.value, "date": date_str},
+        )
+        return data["back"]
+
+    async def inverter_data(self, inverter_id, date):
+        """Get inverter data for specified date or today."""
+        if date is None:
+            date = datetime.date.today()
+        _, data = await self._request(
+            "GET",
+            "newInverterAPI.do",
+            params={
+                "op": "getInverterData",
+                "id": inverter_id,
+                "type": 1,
+                "date": date.strftime("%Y-%m-%d"),
+            },
+        )
+        return data
+
+    async def inverter_detail(self, inverter_id):
+        """Get "All parameters" from PV inverter."""
+        _, data = await self._request(
+            "GET",
+            "newInverterAPI.do",
+            params={"op": "getInverterDetailData", "inverterId": inverter_id},
+        )
+        return data
+
+    async def inverter_detail_two(self, inverter_id):
+        """Get "All parameters" from PV inverter."""
+        _, data = await self._request(
+            "GET",
+            "newInverterAPI.do",
+            params={"op": "getInverterDetailData_two", "inverterId": inverter_id},
+        )
+        return data
+
+    async def tlx_data(self, tlx_id, date):
+        """Get inverter data for specified date or today."""
+        if date is None:
+            date = datetime.date.today()
+        _, data = await self._request(
+            "GET",
+            "newTlxApi.do",
+            params={
+                "op": "getTlxData",
+                "id": tlx_id,
+                "type": 1,
+                "date": date.strftime("%Y-%m-%d"),
+            },
+        )
+        return data
+
+    async def tlx_detail(self, tlx_id):
+        """Get "All parameters" from PV inverter."""
+        _, data = await self._request(
+            "GET", "newTlxApi.do", params={"op": "getTlxDetailData", "id": tlx_id}
+        )
+        return data
+
+    async def mix_info(self, mix_id):
+        """Get "All parameters" from Mix device."""
+        _, data = await self._request(
+            "GET", "newMixApi.do", params={"op": "getMixInfo", "mixId": mix_id}
+        )
+        return data
+
+    async def mix_info2(self, mix_id, plant_id):
+        """Get "All parameters" from Mix device."""
+        _, data = await self._request(
+            "POST",
+            "newMixApi.do",
+            params={"op": "getSystemStatus_KW"},
+            data={"mixId": mix_id, "plantId": plant_id},
+        )
+        return data
+
+    async def storage_detail(self, storage_id):
+        """Get "All parameters" from battery storage."""
+        _, data = await self._request(
+            "GET",
+            "newStorageAPI.do",
+            params={"op": "getStorageInfo_sacolar", "storageId": storage_id},
+        )
+        return data
+
+    async def storage_params(self, storage_id):
+        """Get much more detail from battery storage."""
+        _, data = await self._request(
+            "GET",
+            "newStorageAPI.do",
+            params={"op": "getStorageParams_sacolar", "storageId": storage_id},
+        )
+        return data
+
+    async def storage_energy_overview(self, plant_id, storage_id):
+        """Get some energy/generation overview data."""
+        _, data = await self._request(
+            "POST",
+            "newStorageAPI.do?op=getEnergyOverviewData_sacolar",
+            params={"plantId": plant_id, "storageSn": storage_id},
+        )
+        return data["obj"]
+
+    async def device_list(self, plant_id):
+        """Get a list of all devices connected to plant, see GrowattApi.device_list."""
+        cached = self._device_lists.get(plant_id)
+        if cached is None or time.monotonic() - cached[0] > self.device_list_ttl:
+            return await self.refresh_device_list(plant_id)
+        return list(cached[1])
+
+    async def refresh_device_list(self, plant_id):
+        """Fetch all pages of the device list of a plant and cache it."""
+
+        async def fetch_page(page_num):
+            info = await self.plant_info(plant_id, page_num, DEVICE_LIST_PAGE_SIZE)
+            return info["deviceList"]
+
+        devices = {}
+        first_page = await fetch_page(1)
+        merge_devices(devices, first_page)
+        page_num = 2
+        done = len(first_page) < DEVICE_LIST_PAGE_SIZE
+        while not done:
+            pages = await asyncio.gather(
+                *(
+                    fetch_page(num)
+                    for num in range(page_num, page_num + DEVICE_LIST_PARALLEL_PAGES)
+                )
+            )
+            for page in pages:
+                if (
+                    not merge_devices(devices, page)
+                    or len(page) < DEVICE_LIST_PAGE_SIZE
+                ):
+                    done = True
+                    break
+            page_num += DEVICE_LIST_PARALLEL_PAGES
+
+        self._device_lists[plant_id] = (time.monotonic(), list(devices.values()))
+        return list(devices.values())
+
+    async def plant_info(self, plant_id, page_num=1, page_size=1):
+        """Get basic plant information with (a page of) the device list."""
+        _, data = await self._request(
+            "GET",
+            "newTwoPlantAPI.do",
+            params={
+                "op": "getAllDeviceList",
+                "plantId": plant_id,
+                "pageNum": page_num,
+                "pageSize": page_size,
+            },
+        )
+        return data
+
+
 from homeassistant.components.sensor import PLATFORM_SCHEMA
 from homeassistant.const import (
+    CONF_DEVICE_CLASS,
+    CONF_HOST,
     CONF_NAME,
     CONF_PASSWORD,
+    CONF_PORT,
+    CONF_UNIT_OF_MEASUREMENT,
     CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
+    SUN_EVENT_SUNRISE,
     ELECTRICAL_CURRENT_AMPERE,
     ENERGY_KILO_WATT_HOUR,
     FREQUENCY_HERTZ,
     POWER_WATT,
     POWER_KILO_WATT,
     TEMP_CELSIUS,
+    TIME_MILLISECONDS,
+    DATA_KILOBYTES,
     VOLT,
     PERCENTAGE,
 )
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity
-from homeassistant.util import Throttle
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_time_interval,
+    track_point_in_utc_time,
+    track_time_interval,
+)
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.sun import get_astral_event_next, is_up
+from homeassistant.util import slugify
+import homeassistant.util.dt as dt_util
+
+from .samples import RollingWindow
 
 _LOGGER = logging.getLogger(__name__)
 
 CONF_PLANT_ID = "plant_id"
+CONF_ASYNC_CLIENT = "async_client"
+CONF_MAX_WORKERS = "max_workers"
+CONF_MIN_SCAN_INTERVAL = "min_scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+CONF_CACHE_DEVICES = "cache_devices"
+CONF_BACKFILL = "backfill"
+CONF_MAX_REQUEST_RATE = "max_request_rate"
+CONF_REQUEST_BUDGET = "request_budget"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_READ_TIMEOUT = "read_timeout"
+CONF_TELEMETRY = "telemetry"
+CONF_RECORD = "record"
+CONF_REPLAY = "replay"
+CONF_REPLAY_TIMING = "replay_timing"
+CONF_MAX_STALENESS = "max_staleness"
+CONF_DERIVED_SENSORS = "derived_sensors"
+CONF_DEVICE_TYPE = "device_type"
+CONF_OPERATION = "operation"
+CONF_INPUTS = "inputs"
+CONF_ROUND = "round"
+CONF_ACCUMULATE_ENERGY = "accumulate_energy"
+CONF_ROLLING_STATISTICS = "rolling_statistics"
+CONF_MODBUS = "modbus"
+CONF_SERIAL = "serial"
+CONF_UNIT = "unit"
+CONF_DATALOGGER_PORT = "datalogger_port"
+CONF_DATALOGGER_FORWARD = "datalogger_forward"
 DEFAULT_PLANT_ID = "0"
 DEFAULT_NAME = "Growatt"
+DEFAULT_MAX_WORKERS = 1
+DEFAULT_MODBUS_PORT = 502
+DEFAULT_DATALOGGER_PORT = 5279
+# Account name of plants read locally, without a Growatt server account.
+LOCAL_ACCOUNT = "local"
+MAX_DISCOVERY_WORKERS = 8
 SCAN_INTERVAL = datetime.timedelta(minutes=5)
+# Devices are not polled while their datalogger pushed data within this time.
+PUSH_TIMEOUT = datetime.timedelta(minutes=10)
+
+ATTR_DATA_UPDATED = "data_updated"
+ATTR_DATA_AGE = "data_age"
+ATTR_STATE_CLASS = "state_class"
+
+# Api key of the output power sensor whose statistics the backfill fills in.
+BACKFILL_API_KEY = "pac"
+
+# Power is not integrated across gaps between samples longer than this.
+ENERGY_MAX_GAP = datetime.timedelta(hours=1)
+# Power units that can be integrated, with their factor to kilowatts.
+KILOWATTS_PER_UNIT = {POWER_WATT: 0.001, POWER_KILO_WATT: 1.0}
+# Windows of the rolling statistics: attribute suffix, span, buckets.
+ROLLING_WINDOWS = (
+    ("15m", datetime.timedelta(minutes=15), 15),
+    ("1h", datetime.timedelta(hours=1), 12),
+    ("24h", datetime.timedelta(days=1), 96),
+)
+
+# Raw value of a sensor that has not read its probe yet, unlike any api value.
+UNREAD = object()
+
+# Power sensors that are no energy flow: rated and reactive power.
+NOT_ACCUMULATED = ("total_maximum_output", "inverter_current_reactive_wattage")
+
+# Errors of parsing a payload that lacks the expected keys or objects, they
+# fail the fetch like FETCH_ERRORS.
+PAYLOAD_ERRORS = (KeyError, TypeError, AttributeError)
+# Errors of a fetch that leave a probe serving its last good data, OSError
+# covers the socket and Modbus errors of the local client.
+FETCH_ERRORS = (
+    OSError,
+    requests.exceptions.RequestException,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    json.decoder.JSONDecodeError,
+    GrowattRequestError,
+)
+
+DATA_CLIENTS = "growatt_clients"
+# Options applied to the client of an account, its entries must agree on them.
+CLIENT_OPTIONS = (
+    CONF_MAX_REQUEST_RATE,
+    CONF_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT,
+    CONF_RECORD,
+    CONF_REPLAY,
+    CONF_REPLAY_TIMING,
+)
+_CLIENTS_LOCK = threading.Lock()
+
+STORAGE_KEY = "growatt_discovery"
+STORAGE_VERSION = 1
+# Fields of a device list entry kept in the discovery cache.
+CACHED_DEVICE_KEYS = ("deviceSn", "deviceType", "deviceAilas")
+
+# Keys holding the PV input power of each device type, used to adapt polling.
+PV_INPUT_KEYS = {
+    "inverter": ("ppv1", "ppv2", "ppv3"),
+    "tlx": ("ppv1", "ppv2", "ppv3"),
+    "mix": ("pPv1", "pPv2"),
+    "storage": ("ppv",),
+}
+# Batteries keep (dis)charging at night, plants with these are never put to sleep.
+BATTERY_DEVICE_TYPES = ("mix", "storage")
+# Relative change of PV input power between polls that counts as changing quickly.
+PV_CHANGE_THRESHOLD = 0.1
 
 # Sensor type order is: Sensor name, Unit of measurement, api data name, additional options
 
@@ -530,33 +1527,18 @@ STORAGE_SENSOR_TYPES = {
 }
 
 MIX_SENSOR_TYPES = {
-    "inverter_voltage_input_1": (
-        "Input 1 voltage", 
-        VOLT,
-        "vPv1",
-        {"device_class": "power"}
-    ),
-    "inverter_voltage_input_2": (
-        "Input 2 voltage", 
-        VOLT,
-        "vPv2",
-        {"device_class": "power"}
-    ),
-    "battery_voltage": (
-        "Battery voltage",
-        VOLT,
-        "vBat",
-        {"device_class": "power"},
-    ),
+    "inverter_voltage_input_1": ("Input 1 voltage", VOLT, "vPv1", {}),
+    "inverter_voltage_input_2": ("Input 2 voltage", VOLT, "vPv2", {}),
+    "battery_voltage": ("Battery voltage", VOLT, "vBat", {}),
     "inverter_wattage_input_1": (
         "Input 1 Wattage",
-        POWER_WATT,
+        POWER_KILO_WATT,
         "pPv1",
         {"device_class": "power"},
     ),
     "inverter_wattage_input_2": (
         "Input 2 Wattage",
-        POWER_WATT,
+        POWER_KILO_WATT,
         "pPv2",
         {"device_class": "power"},
     ),
@@ -594,7 +1576,7 @@ MIX_SENSOR_TYPES = {
         "Battery SOC",
         PERCENTAGE,
         "SOC",
-        {"device_class": "power"},
+        {"device_class": "battery"},
     ),
 }
 
@@ -710,100 +1692,1587 @@ TLX_SENSOR_TYPES = {
 
 SENSOR_TYPES = {**TOTAL_SENSOR_TYPES, **INVERTER_SENSOR_TYPES, **STORAGE_SENSOR_TYPES, **MIX_SENSOR_TYPES, **TLX_SENSOR_TYPES}
 
-PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
+# Sensors computed from other api keys of the same payload, by device type:
+# name, unit, operation, input keys, options. Inputs can be earlier derived keys.
+DERIVED_SENSOR_TYPES = {
+    "inverter": {
+        "inverter_pv_power": (
+            "PV input power",
+            POWER_WATT,
+            "sum",
+            ("ppv1", "ppv2", "ppv3"),
+            {"device_class": "power", "round": 1},
+        ),
+        "inverter_efficiency": (
+            "Conversion efficiency",
+            PERCENTAGE,
+            "efficiency",
+            ("pac", "inverter_pv_power"),
+            {"round": 1},
+        ),
+    },
+    "tlx": {
+        "tlx_pv_power": (
+            "PV input power",
+            POWER_WATT,
+            "sum",
+            ("ppv1", "ppv2", "ppv3"),
+            {"device_class": "power", "round": 1},
+        ),
+        "tlx_efficiency": (
+            "Conversion efficiency",
+            PERCENTAGE,
+            "efficiency",
+            ("pac", "tlx_pv_power"),
+            {"round": 1},
+        ),
+    },
+    "mix": {
+        "mix_self_consumption": (
+            "Self consumption",
+            POWER_KILO_WATT,
+            "difference",
+            ("ppv", "pactogrid"),
+            {"device_class": "power", "round": 3},
+        ),
+        "mix_self_consumption_rate": (
+            "Self consumption rate",
+            PERCENTAGE,
+            "efficiency",
+            ("mix_self_consumption", "ppv"),
+            {"round": 1},
+        ),
+        "mix_battery_net_flow": (
+            "Battery net charge power",
+            POWER_KILO_WATT,
+            "difference",
+            ("chargePower", "pdisCharge1"),
+            {"device_class": "power", "round": 3},
+        ),
+    },
+    "storage": {
+        "storage_battery_net_charge_today": (
+            "Battery net charge today",
+            ENERGY_KILO_WATT_HOUR,
+            "difference",
+            ("eChargeToday", "eBatDisChargeToday"),
+            {"round": 2},
+        ),
+    },
+}
+
+DERIVED_OPERATIONS = ("sum", "difference", "ratio", "efficiency")
+
+# Diagnostic sensors of the request telemetry: name, unit of measurement.
+TELEMETRY_SENSOR_TYPES = {
+    "requests": ("API requests", "requests"),
+    "errors": ("API errors", "errors"),
+    "logins": ("API logins", "logins"),
+    "received": ("API data received", DATA_KILOBYTES),
+    "mean_latency": ("API mean latency", TIME_MILLISECONDS),
+    "slowest_device": ("Slowest device fetch", TIME_MILLISECONDS),
+}
+
+# Keys of a storage device read from getEnergyOverviewData_sacolar, the other
+# keys come from getStorageParams_sacolar.
+STORAGE_ENERGY_OVERVIEW_KEYS = (
+    "eBatDisChargeToday",
+    "eBatDisChargeTotal",
+    "eacDisChargeToday",
+    "eopDischrToday",
+    "eopDischrTotal",
+    "eacChargeToday",
+    "eChargeTotal",
+    "eChargeToday",
+    "eToUserToday",
+    "eToUserTotal",
+)
+
+# The GrowattApi method providing each api data name, by device type.
+ENDPOINT_BY_API_KEY = {
+    "total": {sensor[2]: "plant_info" for sensor in TOTAL_SENSOR_TYPES.values()},
+    "inverter": {
+        sensor[2]: "inverter_detail" for sensor in INVERTER_SENSOR_TYPES.values()
+    },
+    "mix": {sensor[2]: "mix_info2" for sensor in MIX_SENSOR_TYPES.values()},
+    "tlx": {sensor[2]: "tlx_detail" for sensor in TLX_SENSOR_TYPES.values()},
+    "storage": {
+        **{sensor[2]: "storage_params" for sensor in STORAGE_SENSOR_TYPES.values()},
+        **dict.fromkeys(STORAGE_ENERGY_OVERVIEW_KEYS, "storage_energy_overview"),
+    },
+}
+
+
+def _number(value):
+    """Return a number sent as a string as int or float, anything else as is."""
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _rounder(ndigits):
+    """Return a converter to a number rounded to `ndigits` digits."""
+
+    def convert(value):
+        value = _number(value)
+        if isinstance(value, (int, float)):
+            return round(value, ndigits)
+        return value
+
+    return convert
+
+
+class GrowattSensorDescription:
+    """A SENSOR_TYPES entry compiled once into the values a sensor reads."""
+
+    __slots__ = ("key", "name", "unit", "api_key", "api_keys", "device_class", "convert")
+
+    def __init__(self, key, sensor_type):
+        """Unpack the (name, unit, api key, options) tuple of a sensor type."""
+        name, unit, api_key, options = sensor_type
+        self.key = key
+        self.name = name
+        self.unit = unit
+        self.api_key = api_key
+        # The api keys that must be fetched for this sensor to have a value.
+        self.api_keys = (api_key,)
+        self.device_class = options.get("device_class")
+        round_to = options.get("round")
+        self.convert = _number if round_to is None else _rounder(round_to)
+
+    def value(self, data):
+        """Return the value of this sensor in a probe's data, as a number if possible."""
+        return self.convert(data.get(self.api_key))
+
+
+class GrowattDerivedDescription(GrowattSensorDescription):
+    """A sensor computed from other values of a payload, stored under its own key."""
+
+    __slots__ = ("operation", "inputs")
+
+    def __init__(self, key, derived_type, derived=None):
+        """Unpack a (name, unit, operation, inputs, options) derived sensor type.
+
+        `derived` holds the descriptions of the derived keys this one may read.
+        """
+        name, unit, operation, inputs, options = derived_type
+        super().__init__(key, (name, unit, key, options))
+        self.operation = operation
+        self.inputs = tuple(inputs)
+        derived = derived or {}
+        api_keys = []
+        for input_key in self.inputs:
+            source = derived.get(input_key)
+            for api_key in source.api_keys if source else (input_key,):
+                if api_key not in api_keys:
+                    api_keys.append(api_key)
+        self.api_keys = tuple(api_keys)
+
+    def compute(self, values):
+        """Return the value of the operation over the input values, None if unknown."""
+        if self.operation == "sum":
+            known = [value for value in values if value is not None]
+            return sum(known) if known else None
+        if any(value is None for value in values):
+            return None
+        if self.operation == "difference":
+            return values[0] - sum(values[1:])
+        if not values[1]:
+            return None
+        if self.operation == "ratio":
+            return values[0] / values[1]
+        return values[0] / values[1] * 100
+
+
+def compile_sensor_types(sensor_types):
+    """Compile a table of sensor types into descriptions by sensor key."""
+    return {
+        key: GrowattSensorDescription(key, sensor_type)
+        for key, sensor_type in sensor_types.items()
+    }
+
+
+def compile_derived_types(derived_types):
+    """Compile a table of derived sensor types into descriptions, in table order."""
+    descriptions = {}
+    for key, derived_type in derived_types.items():
+        descriptions[key] = GrowattDerivedDescription(key, derived_type, descriptions)
+    return descriptions
+
+
+def derive(data, descriptions):
+    """Return a copy of a payload with the values of the derived descriptions added.
+
+    Every input is converted to a number once, however many sensors read it,
+    and the values are computed in one pass in description order.
+    """
+    derived = dict(data)
+    numbers = {}
+    for description in descriptions:
+        values = []
+        for key in description.inputs:
+            if key not in numbers:
+                value = _number(derived.get(key))
+                numbers[key] = value if isinstance(value, (int, float)) else None
+            values.append(numbers[key])
+        value = description.compute(values)
+        derived[description.api_key] = numbers[description.api_key] = value
+    return derived
+
+
+# Compiled per device type, the merged SENSOR_TYPES shares keys between them.
+TOTAL_SENSORS = compile_sensor_types(TOTAL_SENSOR_TYPES)
+SENSORS_BY_DEVICE_TYPE = {
+    "inverter": compile_sensor_types(INVERTER_SENSOR_TYPES),
+    "mix": compile_sensor_types(MIX_SENSOR_TYPES),
+    "storage": compile_sensor_types(STORAGE_SENSOR_TYPES),
+    "tlx": compile_sensor_types(TLX_SENSOR_TYPES),
+}
+
+
+def _derived_sensor(value):
+    """Validate a derived sensor: a DERIVED_SENSOR_TYPES key or a custom definition."""
+    if isinstance(value, str):
+        if not any(value in types for types in DERIVED_SENSOR_TYPES.values()):
+            raise vol.Invalid(f"Unknown derived sensor {value}")
+        return value
+    value = DERIVED_SENSOR_SCHEMA(value)
+    if value[CONF_OPERATION] in ("ratio", "efficiency") and len(value[CONF_INPUTS]) != 2:
+        raise vol.Invalid(f"A {value[CONF_OPERATION]} takes exactly 2 {CONF_INPUTS}")
+    if value[CONF_OPERATION] == "difference" and len(value[CONF_INPUTS]) < 2:
+        raise vol.Invalid(f"A difference takes at least 2 {CONF_INPUTS}")
+    return value
+
+
+DERIVED_SENSOR_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NAME): cv.string,
+        vol.Required(CONF_DEVICE_TYPE): vol.In(
+            ("total", *SENSORS_BY_DEVICE_TYPE)
+        ),
+        vol.Required(CONF_OPERATION): vol.In(DERIVED_OPERATIONS),
+        vol.Required(CONF_INPUTS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(CONF_UNIT_OF_MEASUREMENT): cv.string,
+        vol.Optional(CONF_DEVICE_CLASS): cv.string,
+        vol.Optional(CONF_ROUND): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    }
+)
+
+
+def _add_derived_type(derived_types, types, key):
+    """Add a DERIVED_SENSOR_TYPES entry after the derived sensors it reads."""
+    for input_key in types[key][3]:
+        if input_key in types:
+            _add_derived_type(derived_types, types, input_key)
+    derived_types.setdefault(key, types[key])
+
+
+def _sensor_key(value):
+    """Validate the key of a sensor type or of a derived sensor."""
+    value = cv.string(value)
+    if value.startswith("derived_") or value in SENSOR_TYPES:
+        return value
+    if any(value in types for types in DERIVED_SENSOR_TYPES.values()):
+        return value
+    raise vol.Invalid(f"Unknown sensor {value}")
+
+
+def derived_descriptions(config):
+    """Compile the configured derived sensors into descriptions by device type."""
+    derived_types = {}
+    for item in config.get(CONF_DERIVED_SENSORS, []):
+        if isinstance(item, str):
+            for device_type, types in DERIVED_SENSOR_TYPES.items():
+                if item in types:
+                    _add_derived_type(
+                        derived_types.setdefault(device_type, {}), types, item
+                    )
+            continue
+        options = {}
+        if CONF_DEVICE_CLASS in item:
+            options["device_class"] = item[CONF_DEVICE_CLASS]
+        if CONF_ROUND in item:
+            options["round"] = item[CONF_ROUND]
+        derived_types.setdefault(item[CONF_DEVICE_TYPE], {})[
+            f"derived_{slugify(item[CONF_NAME])}"
+        ] = (
+            item[CONF_NAME],
+            item.get(CONF_UNIT_OF_MEASUREMENT),
+            item[CONF_OPERATION],
+            item[CONF_INPUTS],
+            options,
+        )
+    return {
+        device_type: compile_derived_types(types)
+        for device_type, types in derived_types.items()
+    }
+
+
+def _transport_on_sync_client(config):
+    """Validate that recording and replaying are only used with the sync client."""
+    if config[CONF_ASYNC_CLIENT] and (CONF_RECORD in config or CONF_REPLAY in config):
+        raise vol.Invalid(
+            f"{CONF_RECORD} and {CONF_REPLAY} are not supported with {CONF_ASYNC_CLIENT}"
+        )
+    return config
+
+
+def _credentials_or_modbus(config):
+    """Validate that the account credentials are given unless reading locally."""
+    if CONF_USERNAME not in config and CONF_MODBUS not in config:
+        raise vol.Invalid(f"{CONF_USERNAME} and {CONF_PASSWORD} are required")
+    return config
+
+
+def _modbus_without_server_options(config):
+    """Validate that no option of the Growatt server client is used with modbus."""
+    if CONF_MODBUS not in config:
+        return config
+    for option in (CONF_RECORD, CONF_REPLAY):
+        if option in config:
+            raise vol.Invalid(f"{option} is not supported with {CONF_MODBUS}")
+    for option in (CONF_ASYNC_CLIENT, CONF_BACKFILL):
+        if config[option]:
+            raise vol.Invalid(f"{option} is not supported with {CONF_MODBUS}")
+    return config
+
+
+MODBUS_DEVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_SERIAL): cv.string,
+        vol.Required(CONF_DEVICE_TYPE): vol.In(tuple(SENSORS_BY_DEVICE_TYPE)),
+        vol.Required(CONF_HOST): cv.string,
+        vol.Optional(CONF_PORT, default=DEFAULT_MODBUS_PORT): cv.port,
+        vol.Optional(CONF_UNIT, default=1): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=247)
+        ),
+        vol.Optional(CONF_NAME): cv.string,
+    }
+)
+
+
+def _forward_address(value):
+    """Validate a "host" or "host:port" to forward the datalogger frames to."""
+    host, _, port = cv.string(value).partition(":")
+    if not host:
+        raise vol.Invalid(f"Invalid address {value}")
+    return host, cv.port(port) if port else DEFAULT_DATALOGGER_PORT
+
+
+def _forward_needs_port(config):
+    """Validate that frames are only forwarded when the dataloggers are received."""
+    if CONF_DATALOGGER_FORWARD in config and CONF_DATALOGGER_PORT not in config:
+        raise vol.Invalid(f"{CONF_DATALOGGER_FORWARD} requires {CONF_DATALOGGER_PORT}")
+    return config
+
+
+def _scan_intervals_in_order(config):
+    """Validate that the minimum scan interval is not above the maximum."""
+    if config[CONF_MIN_SCAN_INTERVAL] > config[CONF_MAX_SCAN_INTERVAL]:
+        raise vol.Invalid(
+            f"{CONF_MIN_SCAN_INTERVAL} must not be larger than {CONF_MAX_SCAN_INTERVAL}"
+        )
+    return config
+
+
+PLATFORM_SCHEMA = vol.All(PLATFORM_SCHEMA.extend(
     {
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
         vol.Optional(CONF_PLANT_ID, default=DEFAULT_PLANT_ID): cv.string,
-        vol.Required(CONF_USERNAME): cv.string,
-        vol.Required(CONF_PASSWORD): cv.string,
+        vol.Inclusive(CONF_USERNAME, "credentials"): cv.string,
+        vol.Inclusive(CONF_PASSWORD, "credentials"): cv.string,
+        vol.Optional(CONF_ASYNC_CLIENT, default=False): cv.boolean,
+        vol.Optional(CONF_MAX_WORKERS, default=DEFAULT_MAX_WORKERS): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_MIN_SCAN_INTERVAL, default=SCAN_INTERVAL): cv.time_period,
+        vol.Optional(CONF_MAX_SCAN_INTERVAL, default=SCAN_INTERVAL): cv.time_period,
+        vol.Optional(CONF_CACHE_DEVICES, default=True): cv.boolean,
+        vol.Optional(CONF_BACKFILL, default=False): cv.boolean,
+        vol.Optional(CONF_MAX_REQUEST_RATE, default=REQUEST_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)
+        ),
+        vol.Optional(CONF_REQUEST_BUDGET): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_CONNECT_TIMEOUT, default=CONNECT_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)
+        ),
+        vol.Optional(CONF_READ_TIMEOUT, default=READ_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)
+        ),
+        vol.Optional(CONF_TELEMETRY, default=False): cv.boolean,
+        vol.Exclusive(CONF_RECORD, "transport"): cv.string,
+        vol.Exclusive(CONF_REPLAY, "transport"): cv.isfile,
+        vol.Optional(CONF_REPLAY_TIMING, default="fast"): vol.In(("original", "fast")),
+        vol.Optional(CONF_MAX_STALENESS): cv.time_period,
+        vol.Optional(CONF_DERIVED_SENSORS): vol.All(cv.ensure_list, [_derived_sensor]),
+        vol.Optional(CONF_ACCUMULATE_ENERGY, default=False): cv.boolean,
+        vol.Optional(CONF_ROLLING_STATISTICS, default=[]): vol.All(
+            cv.ensure_list, [_sensor_key]
+        ),
+        vol.Optional(CONF_MODBUS): vol.All(
+            cv.ensure_list, [MODBUS_DEVICE_SCHEMA], vol.Length(min=1)
+        ),
+        vol.Optional(CONF_DATALOGGER_PORT): cv.port,
+        vol.Optional(CONF_DATALOGGER_FORWARD): _forward_address,
     }
+),
+    _credentials_or_modbus,
+    _scan_intervals_in_order,
+    _transport_on_sync_client,
+    _modbus_without_server_options,
+    _forward_needs_port,
 )
 
 
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the Growatt sensor, on the event loop if the async client is enabled."""
+    if not config[CONF_ASYNC_CLIENT]:
+
+        def add_entities(new_entities, update_before_add=False):
+            hass.add_job(async_add_entities, new_entities, update_before_add)
+
+        await hass.async_add_executor_job(
+            setup_platform, hass, config, add_entities, discovery_info
+        )
+        return
+
+    api = _shared_client(
+        hass,
+        config,
+        lambda: AsyncGrowattApi(
+            async_create_clientsession(hass),
+            config[CONF_MAX_REQUEST_RATE],
+            (config[CONF_CONNECT_TIMEOUT], config[CONF_READ_TIMEOUT]),
+        ),
+    )
+    if api is None:
+        return
+    plants = GrowattPlants(hass, config, api)
+    store = _discovery_store(hass, config)
+    if CONF_DATALOGGER_PORT in config:
+        await _async_start_datalogger(hass, config, plants)
+    if plants.telemetry is not None:
+        from .telemetry import register_telemetry  # pylint: disable=import-outside-toplevel
+
+        register_telemetry(hass, plants.telemetry)
+        async_add_entities(_telemetry_sensors(config, plants.telemetry))
+
+    cached = await store.async_load() if store is not None else None
+    if cached is not None:
+        # Entities come straight from the cache, the live topology is checked
+        # and the first snapshot fetched without holding up startup.
+        entities, _ = plants.update(*_cached_topology(cached))
+        async_add_entities(entities)
+        hass.async_create_task(
+            _async_discover(hass, config, plants, store, async_add_entities)
+        )
+        return
+    await _async_discover(hass, config, plants, store, async_add_entities)
+
+
 def setup_platform(hass, config, add_entities, discovery_info=None):
     """Set up the Growatt sensor."""
-    username = config[CONF_USERNAME]
-    password = config[CONF_PASSWORD]
-    plant_id = config[CONF_PLANT_ID]
-    name = config[CONF_NAME]
+    if CONF_MODBUS in config:
+        _setup_modbus(hass, config, add_entities)
+        return
+    max_workers = config[CONF_MAX_WORKERS]
+    api = _shared_client(
+        hass,
+        config,
+        lambda: _mount_transport(
+            hass,
+            config,
+            GrowattApi(
+                max_request_rate=config[CONF_MAX_REQUEST_RATE],
+                timeout=(config[CONF_CONNECT_TIMEOUT], config[CONF_READ_TIMEOUT]),
+            ),
+        ),
+    )
+    if api is None:
+        return
+    api.grow_pool(max(max_workers, MAX_DISCOVERY_WORKERS))
+    plants = GrowattPlants(hass, config, api, max_workers)
+    store = _discovery_store(hass, config)
+    if CONF_DATALOGGER_PORT in config:
+        hass.add_job(_async_start_datalogger, hass, config, plants)
+    if plants.telemetry is not None:
+        from .telemetry import register_telemetry  # pylint: disable=import-outside-toplevel
+
+        hass.add_job(register_telemetry, hass, plants.telemetry)
+        add_entities(_telemetry_sensors(config, plants.telemetry))
+
+    cached = None
+    if store is not None:
+        cached = asyncio.run_coroutine_threadsafe(
+            store.async_load(), hass.loop
+        ).result()
+    if cached is not None:
+        # Entities come straight from the cache, the live topology is checked
+        # and the first snapshot fetched without holding up startup.
+        entities, _ = plants.update(*_cached_topology(cached))
+        add_entities(entities)
+        hass.add_job(_discover, hass, config, plants, store, add_entities)
+        return
+    _discover(hass, config, plants, store, add_entities)
+
+
+def _setup_modbus(hass, config, add_entities):
+    """Set up the devices read over Modbus TCP as one plant, without the server."""
+    # Only loaded when devices are read locally.
+    from .modbus import GrowattModbusApi, ModbusDevice  # pylint: disable=import-outside-toplevel
+
+    devices = config[CONF_MODBUS]
+    api = GrowattModbusApi(
+        [
+            ModbusDevice(
+                device[CONF_SERIAL],
+                device[CONF_DEVICE_TYPE],
+                device[CONF_HOST],
+                device[CONF_PORT],
+                device[CONF_UNIT],
+            )
+            for device in devices
+        ],
+        timeout=config[CONF_READ_TIMEOUT],
+    )
+    hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: api.close())
+    plants = GrowattPlants(hass, config, api, config[CONF_MAX_WORKERS])
+    if CONF_DATALOGGER_PORT in config:
+        hass.add_job(_async_start_datalogger, hass, config, plants)
+    if plants.telemetry is not None:
+        from .telemetry import register_telemetry  # pylint: disable=import-outside-toplevel
+
+        hass.add_job(register_telemetry, hass, plants.telemetry)
+        add_entities(_telemetry_sensors(config, plants.telemetry))
+
+    entities, _ = plants.update(
+        {f"{LOCAL_ACCOUNT}_{slugify(config[CONF_NAME])}": config[CONF_NAME]},
+        [
+            [
+                {
+                    "deviceSn": device[CONF_SERIAL],
+                    "deviceType": device[CONF_DEVICE_TYPE],
+                    "deviceAilas": device.get(CONF_NAME, device[CONF_SERIAL]),
+                }
+                for device in devices
+            ]
+        ],
+    )
+    coordinators = list(plants.coordinators.values())
+    for coordinator in coordinators:
+        # The totals sum the readings of the devices, update them last.
+        total = coordinator.probes.pop(0)
+        coordinator.add_probe(total)
+        coordinator.refresh()
+    add_entities(entities)
+    for coordinator in coordinators:
+        coordinator.start()
+
+
+async def _async_start_datalogger(hass, config, plants):
+    """Receive the frames the dataloggers push and apply them to the plants."""
+    # Only loaded when the dataloggers push to Home Assistant.
+    from .datalogger import DataloggerReceiver  # pylint: disable=import-outside-toplevel
+
+    receiver = DataloggerReceiver(
+        plants.push,
+        port=config[CONF_DATALOGGER_PORT],
+        forward=config.get(CONF_DATALOGGER_FORWARD),
+    )
+    try:
+        await receiver.start()
+    except OSError as err:
+        _LOGGER.error(
+            "Unable to receive dataloggers on port %s: %s",
+            config[CONF_DATALOGGER_PORT],
+            err,
+        )
+        return
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, receiver.stop)
 
-    api = GrowattApi()
 
-    # Log in to api and fetch first plant if no plant id is defined.
-    login_response = api.login(username, password)
-    if not login_response["success"] and login_response["errCode"] == "102":
-        _LOGGER.error("Username or Password may be incorrect!")
+def _user_id(login_response):
+    """Return the user id of a login response, raise if the login failed."""
+    if "userId" not in login_response:
+        raise GrowattRequestError(
+            f"Login failed: {login_response.get('msg', login_response.get('errCode'))}"
+        )
+    return login_response["userId"]
+
+
+def _discover(hass, config, plants, store, add_entities):
+    """Discover the plants of the account, then fetch and schedule them."""
+    api = plants.api
+    discovered = None
+    try:
+        # Log in to api and fetch all plants if no plant id is defined.
+        login_response = api.ensure_login(config[CONF_USERNAME], config[CONF_PASSWORD])
+        if not login_response["success"] and login_response["errCode"] == "102":
+            _LOGGER.error("Username or Password may be incorrect!")
+            if not plants.coordinators:
+                return
+        plants.user_id = _user_id(login_response)
+        discovered = _discover_plants(api, config, plants.user_id)
+        if not discovered:
+            if not plants.coordinators:
+                return
+            raise GrowattRequestError("No plants found")
+
+        # Plants are listed side by side, so startup takes as long as the
+        # slowest plant instead of all of them.
+        with ThreadPoolExecutor(
+            max_workers=min(len(discovered), MAX_DISCOVERY_WORKERS),
+            thread_name_prefix="growatt_discovery",
+        ) as executor:
+            device_lists = list(executor.map(api.device_list, discovered))
+    except FETCH_ERRORS + (CircuitOpenError,) as err:
+        if not plants.coordinators:
+            raise
+        _LOGGER.warning(
+            "Unable to discover the plants, using the cached devices: %s", err
+        )
+        discovered = None
+
+    added = []
+    if discovered is not None:
+        added, removed = plants.update(discovered, device_lists)
+        for entity in removed:
+            hass.add_job(entity.async_remove)
+        if store is not None:
+            hass.add_job(store.async_save, plants.as_dict())
+
+    # Fetch the first snapshot before new entities are added so they start
+    # with a state, then keep refreshing every plant in its own cycle.
+    coordinators = list(plants.coordinators.values())
+    with ThreadPoolExecutor(
+        max_workers=min(len(coordinators), MAX_DISCOVERY_WORKERS),
+        thread_name_prefix="growatt_discovery",
+    ) as executor:
+        list(executor.map(lambda coordinator: coordinator.refresh(), coordinators))
+
+    add_entities(added)
+    for coordinator in coordinators:
+        coordinator.start()
+    unsub = track_time_interval(
+        hass,
+        lambda now: _rediscover(hass, plants, store, add_entities),
+        datetime.timedelta(seconds=DEVICE_LIST_TTL),
+    )
+    hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: unsub())
+
+
+def _rediscover(hass, plants, store, add_entities):
+    """Add the devices that joined the known plants and remove the ones that left."""
+    plant_ids = list(plants.coordinators)
+    try:
+        device_lists = [plants.api.device_list(plant_id) for plant_id in plant_ids]
+    except FETCH_ERRORS + (CircuitOpenError,) as err:
+        _LOGGER.warning("Unable to refresh the devices of the plants: %s", err)
         return
-    user_id = login_response["userId"]
-    if plant_id == DEFAULT_PLANT_ID:
-        plant_info = api.plant_list(user_id)
-        plant_id = plant_info["data"][0]["plantId"]
-
-    # Get a list of devices for specified plant to add sensors for.
-    devices = api.device_list(plant_id)
-    entities = []
-    probe = GrowattData(api, username, password, plant_id, "total")
-    for sensor in TOTAL_SENSOR_TYPES:
-        entities.append(
-            GrowattInverter(probe, f"{name} Total", sensor, f"{plant_id}-{sensor}")
-        )
-
-    # Add sensors for each device in the specified plant.
-    for device in devices:
-        probe = GrowattData(
-            api, username, password, device["deviceSn"], device["deviceType"]
+    added, removed = plants.update_devices(plant_ids, device_lists)
+    for entity in removed:
+        hass.add_job(entity.async_remove)
+    if added or removed:
+        if store is not None:
+            hass.add_job(store.async_save, plants.as_dict())
+        add_entities(added)
+
+
+async def _async_discover(hass, config, plants, store, async_add_entities):
+    """Discover the plants of the account, then fetch and schedule them."""
+    api = plants.api
+    discovered = None
+    try:
+        # Log in to api and fetch all plants if no plant id is defined.
+        login_response = await api.ensure_login(
+            config[CONF_USERNAME], config[CONF_PASSWORD]
         )
-        sensors = []
-        if device["deviceType"] == "inverter":
-            sensors = INVERTER_SENSOR_TYPES
-        elif device["deviceType"] == "mix":
-            probe.plant_id = plant_id
-            sensors = MIX_SENSOR_TYPES
-        elif device["deviceType"] == "storage":
-            probe.plant_id = plant_id
-            sensors = STORAGE_SENSOR_TYPES
-        elif device["deviceType"] == "tlx":
-            sensors = TLX_SENSOR_TYPES
+        if not login_response["success"] and login_response["errCode"] == "102":
+            _LOGGER.error("Username or Password may be incorrect!")
+            if not plants.coordinators:
+                return
+        plants.user_id = _user_id(login_response)
+        discovered = await _async_discover_plants(api, config, plants.user_id)
+        if not discovered:
+            if not plants.coordinators:
+                return
+            raise GrowattRequestError("No plants found")
+        device_lists = await asyncio.gather(
+            *(api.device_list(plant_id) for plant_id in discovered)
+        )
+    except FETCH_ERRORS + (CircuitOpenError,) as err:
+        if not plants.coordinators:
+            raise
+        _LOGGER.warning(
+            "Unable to discover the plants, using the cached devices: %s", err
+        )
+        discovered = None
+
+    added = []
+    if discovered is not None:
+        added, removed = plants.update(discovered, device_lists)
+        for entity in removed:
+            hass.async_create_task(entity.async_remove())
+        if store is not None:
+            await store.async_save(plants.as_dict())
+
+    coordinators = list(plants.coordinators.values())
+    await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+    async_add_entities(added)
+    for coordinator in coordinators:
+        coordinator.async_start()
+
+    async def rediscover(now):
+        await _async_rediscover(hass, plants, store, async_add_entities)
+
+    unsub = async_track_time_interval(
+        hass, rediscover, datetime.timedelta(seconds=DEVICE_LIST_TTL)
+    )
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: unsub())
+
+
+async def _async_rediscover(hass, plants, store, async_add_entities):
+    """Add the devices that joined the known plants and remove the ones that left."""
+    plant_ids = list(plants.coordinators)
+    try:
+        device_lists = await asyncio.gather(
+            *(plants.api.device_list(plant_id) for plant_id in plant_ids)
+        )
+    except FETCH_ERRORS + (CircuitOpenError,) as err:
+        _LOGGER.warning("Unable to refresh the devices of the plants: %s", err)
+        return
+    added, removed = plants.update_devices(plant_ids, device_lists)
+    for entity in removed:
+        hass.async_create_task(entity.async_remove())
+    if added or removed:
+        if store is not None:
+            await store.async_save(plants.as_dict())
+        async_add_entities(added)
+
+
+def _shared_client(hass, config, create):
+    """Return the client of the configured account, created by `create` once.
+
+    Platform entries of the same account share a client: one login, one
+    session and connection pool, one device list cache and merged in-flight
+    requests. Returns None, after logging an error, for an entry that sets
+    the CLIENT_OPTIONS differently than the entry that created the client.
+    """
+    key = (config[CONF_USERNAME], config[CONF_ASYNC_CLIENT])
+    options = {option: config.get(option) for option in CLIENT_OPTIONS}
+    with _CLIENTS_LOCK:
+        clients = hass.data.setdefault(DATA_CLIENTS, {})
+        if key not in clients:
+            clients[key] = (create(), options)
+        client, client_options = clients[key]
+    conflicts = [
+        option for option in CLIENT_OPTIONS if options[option] != client_options[option]
+    ]
+    if conflicts:
+        _LOGGER.error(
+            "Growatt account %s is already set up with other %s, "
+            "entries of an account share its client and must agree on them",
+            config[CONF_USERNAME],
+            ", ".join(conflicts),
+        )
+        return None
+    return client
+
+
+def _mount_transport(hass, config, api):
+    """Record the traffic of a new client, or replay it, if configured."""
+    if CONF_RECORD not in config and CONF_REPLAY not in config:
+        return api
+    # pylint: disable=import-outside-toplevel
+    from .transport import (
+        ArchiveReader,
+        ArchiveWriter,
+        RecordingAdapter,
+        ReplayAdapter,
+    )
+
+    if CONF_RECORD in config:
+        writer = ArchiveWriter(config[CONF_RECORD])
+        hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: writer.close())
+        api.mount(lambda **kwargs: RecordingAdapter(writer, **kwargs))
+        _LOGGER.info("Recording Growatt traffic to %s", config[CONF_RECORD])
+    else:
+        reader = ArchiveReader(config[CONF_REPLAY])
+        # Nothing reaches the server, there is no rate to keep to.
+        api.max_request_rate = None
+        api.mount(
+            lambda **kwargs: ReplayAdapter(reader, config[CONF_REPLAY_TIMING], **kwargs)
+        )
+        _LOGGER.info(
+            "Replaying %d Growatt exchanges from %s", len(reader), config[CONF_REPLAY]
+        )
+    return api
+
+
+def _plant_names(config, plants):
+    """Map the ids of the discovered plants to the name used for their sensors."""
+    name = config[CONF_NAME]
+    if not plants:
+        _LOGGER.error("No plants found for this Growatt account")
+        return {}
+    if len(plants) == 1:
+        return {plants[0]["plantId"]: name}
+    return {
+        plant["plantId"]: f"{name} {plant.get('plantName', plant['plantId'])}"
+        for plant in plants
+    }
+
+
+def _discover_plants(api, config, user_id):
+    """Return the plants to set up, every plant of the account by default."""
+    if config[CONF_PLANT_ID] != DEFAULT_PLANT_ID:
+        return {config[CONF_PLANT_ID]: config[CONF_NAME]}
+    return _plant_names(config, api.plant_list(user_id)["data"])
+
+
+async def _async_discover_plants(api, config, user_id):
+    """Return the plants to set up, every plant of the account by default."""
+    if config[CONF_PLANT_ID] != DEFAULT_PLANT_ID:
+        return {config[CONF_PLANT_ID]: config[CONF_NAME]}
+    return _plant_names(config, (await api.plant_list(user_id))["data"])
+
+
+def _discovery_store(hass, config):
+    """Return the store caching the discovered plants, None if disabled."""
+    if not config[CONF_CACHE_DEVICES]:
+        return None
+    # Entries of one account differ only in their options, a digest of those
+    # keeps every entry to its own cache, stable across restarts.
+    options = {key: value for key, value in config.items() if key != CONF_PASSWORD}
+    digest = hashlib.sha256(
+        json.dumps(options, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:12]
+    key = (
+        f"{STORAGE_KEY}.{slugify(config[CONF_USERNAME])}_{config[CONF_PLANT_ID]}_{digest}"
+    )
+    return Store(hass, STORAGE_VERSION, key)
+
+
+def _cached_topology(cached):
+    """Return the plants and device lists saved by GrowattPlants.as_dict()."""
+    plants = {plant["plant_id"]: plant["name"] for plant in cached["plants"]}
+    device_lists = [plant["devices"] for plant in cached["plants"]]
+    return plants, device_lists
+
+
+def _telemetry_sensors(config, telemetry):
+    """Create the diagnostic sensors of the request telemetry."""
+    prefix = f"{slugify(config.get(CONF_USERNAME, LOCAL_ACCOUNT))}_{config[CONF_PLANT_ID]}"
+    return [
+        GrowattTelemetrySensor(
+            telemetry, f"{config[CONF_NAME]} {name}", unit, kind, f"{prefix}-{kind}"
+        )
+        for kind, (name, unit) in TELEMETRY_SENSOR_TYPES.items()
+    ]
+
+
+def _scheduler(config):
+    """Create the poll scheduler of a plant."""
+    return GrowattPollScheduler(
+        config[CONF_MIN_SCAN_INTERVAL], config[CONF_MAX_SCAN_INTERVAL]
+    )
+
+
+class GrowattPlants:
+    """The coordinators, probes and sensors set up for one platform entry."""
+
+    def __init__(self, hass, config, api, max_workers=DEFAULT_MAX_WORKERS):
+        """Initialize without any plants."""
+        self.hass = hass
+        self.config = config
+        self.api = api
+        self.max_workers = max_workers
+        self.user_id = None
+        self.backfill = None
+        self.telemetry = None
+        self.derived = derived_descriptions(config)
+        if config[CONF_TELEMETRY]:
+            # Pulls in the http component, only loaded when telemetry is enabled.
+            from .telemetry import GrowattTelemetry  # pylint: disable=import-outside-toplevel
+
+            if api.telemetry is None:
+                api.telemetry = GrowattTelemetry(config.get(CONF_USERNAME, LOCAL_ACCOUNT))
+            self.telemetry = api.telemetry
+        if config[CONF_BACKFILL]:
+            # Pulls in the recorder, only loaded when backfilling is enabled.
+            from .backfill import GrowattBackfill  # pylint: disable=import-outside-toplevel
+
+            self.backfill = GrowattBackfill(hass)
+        self.coordinators = {}
+        self._names = {}
+        self._devices = {}
+        self._probes = {}
+        self._entities = {}
+
+    def update(self, plants, device_lists):
+        """Set up new plants and devices and tear down the ones that are gone.
+
+        Returns the sensors to add and the sensors to remove.
+        """
+        added = []
+        removed = []
+        for plant_id in list(self.coordinators):
+            if plant_id not in plants:
+                removed.extend(self._remove_plant(plant_id))
+
+        for (plant_id, name), devices in zip(plants.items(), device_lists):
+            if plant_id not in self.coordinators:
+                added.extend(self._add_plant(plant_id, name))
+            known = self._devices[plant_id]
+            live = {device["deviceSn"]: device for device in devices}
+            for serial in [serial for serial in known if serial not in live]:
+                removed.extend(self._remove_device(plant_id, serial))
+            for serial, device in live.items():
+                if serial not in known:
+                    added.extend(self._add_device(plant_id, device))
+        return added, removed
+
+    def update_devices(self, plant_ids, device_lists):
+        """Match the devices of known plants to fresh device lists, see update()."""
+        return self.update(
+            {plant_id: self._names[plant_id] for plant_id in plant_ids}, device_lists
+        )
+
+    def as_dict(self):
+        """Return the discovered topology to store."""
+        return {
+            "user_id": self.user_id,
+            "plants": [
+                {
+                    "plant_id": plant_id,
+                    "name": self._names[plant_id],
+                    "devices": [
+                        {key: device.get(key) for key in CACHED_DEVICE_KEYS}
+                        for device in self._devices[plant_id].values()
+                    ],
+                }
+                for plant_id in self.coordinators
+            ],
+        }
+
+    def push(self, record):
+        """Apply a record pushed by a datalogger to the probe of its device.
+
+        Runs on the event loop for every data frame as it arrives. Records
+        the datalogger buffered while offline are history, not the current
+        state, and are left to the Growatt server.
+        """
+        if record.buffered:
+            return
+        for (plant_id, serial), probe in self._probes.items():
+            if serial == record.serial:
+                break
+        else:
+            _LOGGER.debug("Ignoring pushed data of unknown device %s", record.serial)
+            return
+        # Only loaded when the dataloggers push to Home Assistant.
+        from .modbus import REGISTERS_BY_DEVICE_TYPE, decode_blocks  # pylint: disable=import-outside-toplevel
+
+        registers = REGISTERS_BY_DEVICE_TYPE.get(probe.growatt_type)
+        if registers is None:
+            return
+        values = decode_blocks(registers, record.blocks)
+        if not values:
+            return
+        keys = {register.key for register in registers}
+        coordinator = self.coordinators[plant_id]
+        if coordinator.on_loop:
+            self._apply_push(coordinator, probe, record.serial, values, keys)
         else:
+            # Sync cycles run on the executor, apply the values there too.
+            self.hass.add_job(
+                self._apply_push, coordinator, probe, record.serial, values, keys
+            )
+
+    def _apply_push(self, coordinator, probe, serial, values, keys):
+        """Store pushed values in their probe and write its entities."""
+        if CONF_MODBUS in self.config:
+            # The local plant totals are summed from the device readings.
+            self.api.remember(serial, values)
+        coordinator.push(probe, values, keys)
+
+    def _add_plant(self, plant_id, name):
+        """Create the coordinator and total sensors of a plant."""
+        coordinator = GrowattPlantCoordinator(
+            self.hass,
+            plant_id,
+            _scheduler(self.config),
+            self.max_workers,
+            self.backfill,
+            self.config.get(CONF_REQUEST_BUDGET),
+            self.telemetry,
+        )
+        self.coordinators[plant_id] = coordinator
+        self._names[plant_id] = name
+        self._devices[plant_id] = {}
+
+        probe = coordinator.add_probe(self._probe(plant_id, "total"))
+        self._probes[(plant_id, None)] = probe
+        entities = self._sensors(
+            coordinator, probe, f"{name} Total", plant_id, TOTAL_SENSORS
+        )
+        self._entities[(plant_id, None)] = entities
+        return entities
+
+    def _add_device(self, plant_id, device):
+        """Create the probe and sensors of a device in a plant."""
+        self._devices[plant_id][device["deviceSn"]] = device
+        sensors = SENSORS_BY_DEVICE_TYPE.get(device["deviceType"])
+        if sensors is None:
             _LOGGER.debug(
                 "Device type %s was found but is not supported right now.",
                 device["deviceType"],
             )
+            return []
 
-        for sensor in sensors:
-            entities.append(
-                GrowattInverter(
+        probe = self._probe(device["deviceSn"], device["deviceType"])
+        if device["deviceType"] in ("mix", "storage"):
+            probe.plant_id = plant_id
+        coordinator = self.coordinators[plant_id]
+        self._probes[(plant_id, device["deviceSn"])] = coordinator.add_probe(probe)
+        entities = self._sensors(
+            coordinator, probe, f"{device['deviceAilas']}", device["deviceSn"], sensors
+        )
+        self._entities[(plant_id, device["deviceSn"])] = entities
+        return entities
+
+    def _sensors(self, coordinator, probe, name, serial, sensors):
+        """Create the sensors of a probe, with its derived and energy sensors."""
+        descriptions = [
+            *sensors.values(),
+            *self.derived.get(probe.growatt_type, {}).values(),
+        ]
+        entities = [
+            GrowattInverter(
+                coordinator, probe, name, description, f"{serial}-{description.key}"
+            )
+            for description in descriptions
+        ]
+        for entity in entities:
+            if entity.description.key in self.config[CONF_ROLLING_STATISTICS]:
+                entity.statistics = [
+                    (suffix, RollingWindow(span.total_seconds(), buckets))
+                    for suffix, span, buckets in ROLLING_WINDOWS
+                ]
+        if self.config[CONF_ACCUMULATE_ENERGY]:
+            entities.extend(
+                GrowattEnergySensor(
+                    coordinator,
                     probe,
-                    f"{device['deviceAilas']}",
-                    sensor,
-                    f"{device['deviceSn']}-{sensor}",
+                    name,
+                    description,
+                    f"{serial}-{description.key}-energy",
                 )
+                for description in descriptions
+                if description.device_class == "power"
+                and description.unit in KILOWATTS_PER_UNIT
+                and description.key not in NOT_ACCUMULATED
+            )
+        return entities
+
+    def _remove_device(self, plant_id, serial):
+        """Forget a device that left a plant and return its sensors."""
+        _LOGGER.info("Device %s was removed from plant %s", serial, plant_id)
+        del self._devices[plant_id][serial]
+        probe = self._probes.pop((plant_id, serial), None)
+        if probe is not None:
+            self.coordinators[plant_id].remove_probe(probe)
+        return self._entities.pop((plant_id, serial), [])
+
+    def _remove_plant(self, plant_id):
+        """Forget a plant that left the account and return its sensors."""
+        _LOGGER.info("Plant %s was removed from the account", plant_id)
+        entities = []
+        for serial in list(self._devices[plant_id]):
+            entities.extend(self._remove_device(plant_id, serial))
+        self._probes.pop((plant_id, None), None)
+        entities.extend(self._entities.pop((plant_id, None), []))
+        self.coordinators.pop(plant_id).stop()
+        del self._names[plant_id]
+        del self._devices[plant_id]
+        return entities
+
+    def _probe(self, device_id, growatt_type):
+        """Create a probe on the shared client."""
+        probe = GrowattData(
+            self.api,
+            self.config.get(CONF_USERNAME),
+            self.config.get(CONF_PASSWORD),
+            device_id,
+            growatt_type,
+        )
+        probe.max_staleness = self.config.get(CONF_MAX_STALENESS)
+        probe.derived = tuple(self.derived.get(growatt_type, {}).values())
+        return probe
+
+
+class GrowattPollScheduler:
+    """Pick the delay until the next poll from the PV input of a plant.
+
+    Polls come every `min_interval` while there is PV input or it changes
+    quickly, the delay doubles for every poll where it is zero or unknown up
+    to `max_interval`.
+    """
+
+    def __init__(self, min_interval, max_interval):
+        """Initialize the scheduler."""
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._last_power = None
+
+    def next_interval(self, power):
+        """Return the delay until the next poll after reading `power` watts."""
+        last_power, self._last_power = self._last_power, power
+        if power is not None and (
+            power > 0
+            or last_power is not None
+            and abs(power - last_power) > PV_CHANGE_THRESHOLD * max(abs(last_power), 1)
+        ):
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    def reset(self):
+        """Start polling at the minimum interval again."""
+        self.interval = self.min_interval
+        self._last_power = None
+
+
+class GrowattPlantCoordinator:
+    """Update all probes of a plant in one cycle and notify their entities."""
+
+    def __init__(
+        self,
+        hass,
+        plant_id,
+        scheduler,
+        max_workers=DEFAULT_MAX_WORKERS,
+        backfill=None,
+        request_budget=None,
+        telemetry=None,
+    ):
+        """Initialize the coordinator."""
+        self.hass = hass
+        self.plant_id = plant_id
+        self.scheduler = scheduler
+        self.backfill = backfill
+        self.request_budget = request_budget
+        self.telemetry = telemetry
+        self.probes = []
+        # Calls of the sync client run on a bounded pool when more than one
+        # worker is allowed, a cycle then takes as long as its slowest call.
+        self._executor = None
+        if max_workers > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="growatt"
             )
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Held while the entities sample and read their probes, pushed data
+        # is applied between the cycles of the sync setup on the executor.
+        self._state_lock = threading.Lock()
+        # Whether the cycles run on the event loop, pushes are applied there.
+        self.on_loop = False
+        # Created by the first async_refresh(), on the event loop: the sync
+        # setup builds coordinators in executor threads without a loop.
+        self._async_lock = None
+        self._unsub_refresh = None
+        self._started = False
+        self._stopped = False
+
+    def add_probe(self, probe):
+        """Register a probe to be updated on every cycle."""
+        self.probes.append(probe)
+        return probe
+
+    def remove_probe(self, probe):
+        """Stop updating a probe."""
+        if probe in self.probes:
+            self.probes.remove(probe)
+
+    def add_listener(self, entity):
+        """Register an entity to be written after every cycle."""
+        self._listeners.append(entity)
+
+    def remove_listener(self, entity):
+        """Stop writing an entity after every cycle."""
+        if entity in self._listeners:
+            self._listeners.remove(entity)
+
+    def pv_power(self):
+        """Return the summed PV input power of the plant, None if unknown."""
+        values = []
+        for probe in self.probes:
+            for key in PV_INPUT_KEYS.get(probe.growatt_type, ()):
+                try:
+                    values.append(float(probe.data[key]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return sum(values) if values else None
+
+    def next_refresh(self):
+        """Return when the next cycle should run."""
+        now = dt_util.utcnow()
+        has_battery = any(
+            probe.growatt_type in BATTERY_DEVICE_TYPES for probe in self.probes
+        )
+        if not has_battery and not is_up(self.hass, now):
+            # Nothing is produced until sunrise, sleep through the night.
+            self.scheduler.reset()
+            return get_astral_event_next(self.hass, SUN_EVENT_SUNRISE, now)
+        return now + self.scheduler.next_interval(self.pv_power())
+
+    def start(self):
+        """Schedule the plant update cycle."""
+        self._started = True
+        self.hass.bus.listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: self.stop())
+        self._schedule_refresh()
+
+    def async_start(self):
+        """Schedule the plant update cycle on the event loop."""
+        self._started = True
+        self.on_loop = True
+        self.hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, lambda event: self.stop()
+        )
+        self._async_schedule_refresh()
 
-    add_entities(entities, True)
+    def _schedule_refresh(self):
+        """Schedule the next cycle."""
+        if not self._stopped:
+            self._unsub_refresh = track_point_in_utc_time(
+                self.hass, self._scheduled_refresh, self.next_refresh()
+            )
+
+    def _async_schedule_refresh(self):
+        """Schedule the next cycle on the event loop."""
+        if not self._stopped:
+            self._unsub_refresh = async_track_point_in_utc_time(
+                self.hass, self._async_scheduled_refresh, self.next_refresh()
+            )
+
+    def _scheduled_refresh(self, now):
+        """Run a scheduled cycle and schedule the next one."""
+        self._unsub_refresh = None
+        try:
+            self.refresh()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected error updating plant %s", self.plant_id)
+        finally:
+            self._schedule_refresh()
+
+    async def _async_scheduled_refresh(self, now):
+        """Run a scheduled cycle on the event loop and schedule the next one."""
+        self._unsub_refresh = None
+        try:
+            await self.async_refresh()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected error updating plant %s", self.plant_id)
+        finally:
+            self._async_schedule_refresh()
+
+    def stop(self):
+        """Cancel the scheduled plant update cycle."""
+        self._stopped = True
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def refresh(self, now=None):
+        """Fetch every probe of the plant once and notify all entities.
+
+        Returns the RequestBudget of the cycle, telling how many requests it
+        used, or None if the cycle was skipped.
+        """
+        # A slow cloud can make a cycle outlast the interval, don't stack them.
+        if not self._lock.acquire(blocking=False):
+            _LOGGER.debug(
+                "Previous update of plant %s still running, skipping", self.plant_id
+            )
+            return None
+        budget = RequestBudget(self.request_budget)
+        token = request_budget.set(budget)
+        try:
+            self._set_demand()
+            snapshots = self._snapshots()
+            if self._executor is None:
+                for probe in self.probes:
+                    self._update_probe(probe, probe.update)
+            else:
+                # Submit the calls of every probe before waiting on any of them.
+                pending = [
+                    (probe, probe.submit(self._executor)) for probe in self.probes
+                ]
+                for probe, futures in pending:
+                    self._update_probe(probe, probe.collect, futures)
+        finally:
+            request_budget.reset(token)
+            self._lock.release()
+
+        self._record_cycle(budget)
+        with self._state_lock:
+            self._check_freshness()
+            changed = self._changed_listeners(snapshots)
+        for entity in changed:
+            entity.schedule_update_ha_state()
+        for probe, entity_id, start, end in self._gaps():
+            self.hass.add_job(self.backfill.fill, probe, entity_id, start, end)
+        return budget
+
+    def _record_cycle(self, budget):
+        """Log the requests of a cycle and record how long each device took."""
+        self._log_budget(budget)
+        if self.telemetry is not None:
+            for probe in self.probes:
+                if probe.fetch_seconds is not None:
+                    self.telemetry.record_device(probe.device_id, probe.fetch_seconds)
+
+    def _log_budget(self, budget):
+        """Log the requests a cycle used, and warn if it ran out of budget."""
+        if budget.denied:
+            _LOGGER.warning(
+                "Plant %s used its budget of %d requests, %d requests were skipped",
+                self.plant_id,
+                budget.limit,
+                budget.denied,
+            )
+        else:
+            _LOGGER.debug("Plant %s used %d requests", self.plant_id, budget.used)
+
+    def _set_demand(self):
+        """Tell every probe which api keys its enabled entities read.
+
+        Entities of disabled sensors are never added to Home Assistant and
+        don't listen, so endpoints only they read are not called. Until the
+        cycle is started nothing listens yet and every endpoint is called, so
+        new entities start with a state.
+        """
+        if not self._started:
+            return
+        adaptive = self.scheduler.min_interval < self.scheduler.max_interval
+        demand = {
+            id(probe): set(PV_INPUT_KEYS.get(probe.growatt_type, ()) if adaptive else ())
+            for probe in self.probes
+        }
+        for entity in self._listeners:
+            keys = demand.get(id(entity.probe))
+            if keys is not None:
+                keys.update(entity.description.api_keys)
+        for probe in self.probes:
+            probe.api_keys = demand[id(probe)]
+
+    def push(self, probe, values, keys):
+        """Store the values a datalogger pushed for a probe and write its entities.
+
+        Runs where the cycles of this coordinator run, on the event loop or
+        on the executor, under the lock the cycles hold to write theirs.
+        """
+        with self._state_lock:
+            probe.push(values, keys)
+            written = self._read_listeners(
+                [entity for entity in self._listeners if entity.probe is probe],
+                {id(probe)},
+            )
+        for entity in written:
+            entity.schedule_update_ha_state()
+
+    def _snapshots(self):
+        """Return the current data of every probe, to compare after a cycle."""
+        return {id(probe): probe.data for probe in self.probes}
+
+    def _check_freshness(self):
+        """Mark the probes not fetched this cycle as stale, dropping expired data."""
+        now = dt_util.utcnow()
+        for probe in self.probes:
+            if not probe.idle:
+                probe.check_freshness(now)
+
+    def _gaps(self):
+        """Return the probes that are back after an outage, with the gap to fill.
+
+        Gaps are returned with the entity id of the output power sensor of
+        the probe, gaps of devices without that sensor enabled are skipped.
+        """
+        if self.backfill is None:
+            return []
+        now = dt_util.utcnow()
+        gaps = []
+        for probe in self.probes:
+            if probe.idle:
+                continue
+            success = not probe.stale
+            gap = self.backfill.record(probe, success, now)
+            entity_id = self._power_entity_id(probe)
+            if gap is not None and entity_id is not None:
+                gaps.append((probe, entity_id, *gap))
+        return gaps
+
+    def _power_entity_id(self, probe):
+        """Return the entity id of the output power sensor of a probe, if enabled."""
+        for entity in self._listeners:
+            if (
+                entity.probe is probe
+                and entity.description.api_key == BACKFILL_API_KEY
+                and entity.device_class == "power"
+                and entity.entity_id
+            ):
+                return entity.entity_id
+        return None
+
+    def _changed_listeners(self, snapshots):
+        """Return the entities whose value moved since `snapshots` was taken.
+
+        The datalogger uploads every few minutes, many polls return the same
+        payload. Unchanged payloads and values are not written to the state
+        machine, which spares the recorder and the event bus. Entities of a
+        stale probe are written every cycle to keep their data age current.
+        Every entity samples every fetch, changed or not, and is written when
+        the sample moved it.
+        """
+        changed = {
+            id(probe)
+            for probe in self.probes
+            if probe.stale
+            or (
+                probe.data is not snapshots.get(id(probe))
+                and probe.data != snapshots.get(id(probe))
+            )
+        }
+        return self._read_listeners(list(self._listeners), changed)
+
+    @staticmethod
+    def _read_listeners(listeners, changed):
+        """Let `listeners` read their probes, return the ones to write.
+
+        Entities of the probes in `changed`, by id, update their state. The
+        error of a device whose data can't be read is logged once and its
+        entities are skipped, the other devices are still written.
+        """
+        entities = []
+        failed = set()
+        for entity in listeners:
+            if id(entity.probe) in failed:
+                continue
+            try:
+                sampled = entity.sample()
+                if (id(entity.probe) in changed and entity.update_state()) or sampled:
+                    entities.append(entity)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(
+                    "Unexpected error reading the data of %s", entity.probe.device_id
+                )
+                failed.add(id(entity.probe))
+        return entities
+
+    @staticmethod
+    def _update_probe(probe, update, *args):
+        """Run a probe update without letting one device fail the whole plant."""
+        try:
+            update(*args)
+        except RequestBudgetExceeded:
+            pass
+        except CircuitOpenError as err:
+            _LOGGER.debug("Skipping %s: %s", probe.device_id, err)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected error updating %s", probe.device_id)
+
+    async def async_refresh(self, now=None):
+        """Fetch every probe of the plant concurrently and write all entities.
+
+        Returns the RequestBudget of the cycle, or None if it was skipped.
+        """
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        if self._async_lock.locked():
+            _LOGGER.debug(
+                "Previous update of plant %s still running, skipping", self.plant_id
+            )
+            return None
+        budget = RequestBudget(self.request_budget)
+        token = request_budget.set(budget)
+        try:
+            async with self._async_lock:
+                probes = list(self.probes)
+                self._set_demand()
+                snapshots = self._snapshots()
+                results = await asyncio.gather(
+                    *(probe.async_update() for probe in probes),
+                    return_exceptions=True,
+                )
+        finally:
+            request_budget.reset(token)
+        for probe, result in zip(probes, results):
+            if isinstance(result, CircuitOpenError):
+                _LOGGER.debug("Skipping %s: %s", probe.device_id, result)
+            elif isinstance(result, Exception) and not isinstance(
+                result, RequestBudgetExceeded
+            ):
+                _LOGGER.error(
+                    "Unexpected error updating %s: %s", probe.device_id, result
+                )
+
+        self._record_cycle(budget)
+        with self._state_lock:
+            self._check_freshness()
+            changed = self._changed_listeners(snapshots)
+        for entity in changed:
+            entity.async_write_ha_state()
+        for probe, entity_id, start, end in self._gaps():
+            self.hass.async_create_task(
+                self.backfill.async_fill(probe, entity_id, start, end)
+            )
+        return budget
 
 
 class GrowattInverter(Entity):
     """Representation of a Growatt Sensor."""
 
-    def __init__(self, probe, name, sensor, unique_id):
+    def __init__(self, coordinator, probe, name, description, unique_id):
         """Initialize a PVOutput sensor."""
-        self.sensor = sensor
+        self.sensor = description.key
+        self.description = description
+        self.coordinator = coordinator
         self.probe = probe
-        self._name = name
+        self._name = f"{name} {description.name}"
         self._state = None
+        # The raw api value the state was converted from.
+        self._raw = UNREAD
+        self._stale = False
         self._unique_id = unique_id
+        # (suffix, RollingWindow) of the rolling statistics, None when disabled.
+        self.statistics = None
+        self._sampled_at = None
 
     @property
     def name(self):
         """Return the name of the sensor."""
-        return f"{self._name} {SENSOR_TYPES[self.sensor][0]}"
+        return self._name
 
     @property
     def unique_id(self):
         """Return the unique id of the sensor."""
         return self._unique_id
 
+    @property
+    def should_poll(self):
+        """Return False, the plant coordinator pushes updates."""
+        return False
+
     @property
     def icon(self):
         """Return the icon of the sensor."""
@@ -812,25 +3281,265 @@ class GrowattInverter(Entity):
     @property
     def state(self):
         """Return the state of the sensor."""
-        result = self.probe.get_data(SENSOR_TYPES[self.sensor][2])
-        round_to = SENSOR_TYPES[self.sensor][3].get("round")
-        if round_to is not None:
-            result = round(result, round_to)
-        return result
+        return self._state
+
+    def update_state(self):
+        """Read the value from the probe, return whether it should be written.
+
+        Most values of a new payload did not move, they are compared raw and
+        only converted when they did. Stale values are always written, their
+        data age moves on.
+        """
+        raw = self.probe.data.get(self.description.api_key)
+        stale = self.probe.stale
+        if raw == self._raw and not stale and not self._stale:
+            return False
+        self._raw = raw
+        state = self.description.convert(raw)
+        if state == self._state and not stale and not self._stale:
+            return False
+        self._state = state
+        self._stale = stale
+        return True
+
+    def sample(self):
+        """Add the value of a fetch, changed or not, to the rolling statistics.
+
+        The change check skips repeated values, which still count in the
+        statistics. Returns whether the value was added and the attributes
+        should be written.
+        """
+        updated_at = self.probe.updated_at
+        if (
+            self.statistics is None
+            or self.probe.stale
+            or updated_at is None
+            or updated_at == self._sampled_at
+        ):
+            return False
+        state = self.description.value(self.probe.data)
+        if not isinstance(state, (int, float)):
+            return False
+        self._sampled_at = updated_at
+        for _, window in self.statistics:
+            window.add(updated_at.timestamp(), state)
+        return True
+
+    @property
+    def extra_state_attributes(self):
+        """Return the age of stale data and the rolling statistics, if any."""
+        attributes = {}
+        updated_at = self.probe.updated_at
+        if self._stale and updated_at is not None:
+            attributes[ATTR_DATA_UPDATED] = updated_at.isoformat()
+            attributes[ATTR_DATA_AGE] = round(
+                (dt_util.utcnow() - updated_at).total_seconds()
+            )
+        if self.statistics is not None:
+            now = dt_util.utcnow().timestamp()
+            for suffix, window in self.statistics:
+                stats = window.stats(now)
+                if stats is None:
+                    continue
+                for name, value in zip(("min", "max", "mean"), stats):
+                    attributes[f"{name}_{suffix}"] = self.description.convert(
+                        round(value, 3)
+                    )
+        return attributes or None
 
     @property
     def device_class(self):
         """Return the device class of the sensor."""
-        return SENSOR_TYPES[self.sensor][3].get("device_class")
+        return self.description.device_class
+
+    @property
+    def capability_attributes(self):
+        """Return the measurement state class of power sensors, for long-term statistics."""
+        if (
+            self.description.device_class == "power"
+            and self.description.unit in KILOWATTS_PER_UNIT
+        ):
+            return {ATTR_STATE_CLASS: "measurement"}
+        return None
 
     @property
     def unit_of_measurement(self):
         """Return the unit of measurement of this entity, if any."""
-        return SENSOR_TYPES[self.sensor][1]
+        return self.description.unit
+
+    async def async_added_to_hass(self):
+        """Register for updates from the plant coordinator."""
+        self.sample()
+        self.update_state()
+        self.coordinator.add_listener(self)
+
+    async def async_will_remove_from_hass(self):
+        """Unregister from the plant coordinator."""
+        self.coordinator.remove_listener(self)
 
-    def update(self):
-        """Get the latest data from the Growat API and updates the state."""
-        self.probe.update()
+
+class GrowattEnergySensor(GrowattInverter, RestoreEntity):
+    """Energy integrated locally from the samples of a power sensor.
+
+    Every fetched power value, repeated or not, is added to the total with
+    the trapezoidal rule, gaps longer than ENERGY_MAX_GAP and stale values
+    are not integrated. Only the last (time, value) sample is kept and the
+    total is restored after a restart.
+    """
+
+    def __init__(self, coordinator, probe, name, description, unique_id):
+        """Initialize the sensor with nothing accumulated."""
+        super().__init__(coordinator, probe, name, description, unique_id)
+        self._name = f"{name} {description.name} energy"
+        self._kilowatts = KILOWATTS_PER_UNIT[description.unit]
+        self._last_sample = None
+        self._total = 0.0
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return "mdi:counter"
+
+    @property
+    def state(self):
+        """Return the accumulated energy in kWh."""
+        return round(self._total, 3)
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        return "energy"
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity."""
+        return ENERGY_KILO_WATT_HOUR
+
+    @property
+    def capability_attributes(self):
+        """Return the state class, the total only grows."""
+        return {ATTR_STATE_CLASS: "total_increasing"}
+
+    @property
+    def extra_state_attributes(self):
+        """Return no attributes, the total stays valid while the power is stale."""
+        return None
+
+    def update_state(self):
+        """Return False, the total only moves with the samples."""
+        return False
+
+    def sample(self):
+        """Add the power of a fetch to the total, return whether it grew."""
+        updated_at = self.probe.updated_at
+        if self.probe.stale or updated_at is None:
+            return False
+        now = updated_at.timestamp()
+        last = self._last_sample
+        if last is not None and now <= last[0]:
+            return False
+        power = self.description.value(self.probe.data)
+        if not isinstance(power, (int, float)):
+            return False
+        self._last_sample = (now, power)
+        if last is None or now - last[0] > ENERGY_MAX_GAP.total_seconds():
+            return False
+        energy = (last[1] + power) / 2 * (now - last[0]) / 3600 * self._kilowatts
+        if energy <= 0:
+            return False
+        self._total += energy
+        return True
+
+    async def async_added_to_hass(self):
+        """Restore the total and register for updates from the coordinator."""
+        last_state = await self.async_get_last_state()
+        if last_state is not None:
+            try:
+                self._total = float(last_state.state)
+            except ValueError:
+                pass
+        await super().async_added_to_hass()
+
+
+class GrowattTelemetrySensor(Entity):
+    """Diagnostic sensor reading the request telemetry of an account."""
+
+    def __init__(self, telemetry, name, unit, kind, unique_id):
+        """Initialize the sensor."""
+        self.telemetry = telemetry
+        self.kind = kind
+        self._name = name
+        self._unit = unit
+        self._unique_id = unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def unique_id(self):
+        """Return the unique id of the sensor."""
+        return self._unique_id
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return "mdi:chart-line"
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity."""
+        return self._unit
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        telemetry = self.telemetry
+        if self.kind == "requests":
+            return telemetry.requests
+        if self.kind == "errors":
+            return telemetry.errors
+        if self.kind == "logins":
+            return telemetry.logins
+        if self.kind == "received":
+            return round(telemetry.bytes / 1000, 1)
+        if self.kind == "mean_latency":
+            latency = telemetry.mean_latency
+            return None if latency is None else round(latency * 1000)
+        if self.kind == "slowest_device":
+            slowest = telemetry.slowest_devices(1)
+            return round(slowest[0][1] * 1000) if slowest else None
+        return None
+
+    @property
+    def extra_state_attributes(self):
+        """Return the figures of every endpoint or device."""
+        endpoints = dict(self.telemetry.endpoints)
+        if self.kind == "requests":
+            return {endpoint: stats.requests for endpoint, stats in endpoints.items()}
+        if self.kind == "errors":
+            return {endpoint: stats.errors for endpoint, stats in endpoints.items()}
+        if self.kind == "received":
+            return {endpoint: stats.bytes for endpoint, stats in endpoints.items()}
+        if self.kind == "mean_latency":
+            attributes = {}
+            for endpoint, stats in endpoints.items():
+                if not stats.requests:
+                    continue
+                p95 = stats.quantile(0.95)
+                attributes[endpoint] = {
+                    "mean_ms": round(stats.mean * 1000),
+                    # None when past the largest bucket, inf is no valid JSON.
+                    "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                }
+            return attributes
+        if self.kind == "slowest_device":
+            return {
+                device_id: round(seconds * 1000)
+                for device_id, seconds in self.telemetry.slowest_devices()
+            }
+        return None
 
 
 class GrowattData:
@@ -846,51 +3555,234 @@ class GrowattData:
         self.data = {}
         self.username = username
         self.password = password
+        # Api keys read by enabled entities, None to fetch everything.
+        self.api_keys = None
+        # Seconds the calls of the last successful update took.
+        self.fetch_seconds = None
+        # When the data was last fetched, it is stale after a cycle that failed
+        # to fetch it and dropped once older than max_staleness, if set.
+        self.updated_at = None
+        self.stale = False
+        self.max_staleness = None
+        # Derived sensor descriptions computed over every fetched payload.
+        self.derived = ()
+        # When the datalogger last pushed data, polling pauses while it does.
+        self.pushed_at = None
+        # Pushes and fetches replace the data from different threads.
+        self._lock = threading.Lock()
+
+    @property
+    def idle(self):
+        """Return True if no enabled entity reads this probe."""
+        return self.api_keys is not None and not self.api_keys
+
+    @property
+    def pushed(self):
+        """Return True while the datalogger pushes the data of this probe."""
+        return (
+            self.pushed_at is not None
+            and dt_util.utcnow() - self.pushed_at < PUSH_TIMEOUT
+        )
+
+    def _endpoints(self):
+        """Return the API calls, as (method, args), that provide this probe's data."""
+        if self.pushed:
+            return []
+        keys = self.api_keys
+        if self.growatt_type == "total":
+            endpoints = [("plant_info", (self.device_id,))]
+        elif self.growatt_type == "inverter":
+            endpoints = [("inverter_detail", (self.device_id,))]
+        elif self.growatt_type == "mix":
+            endpoints = [("mix_info2", (self.device_id, self.plant_id))]
+        elif self.growatt_type == "tlx":
+            endpoints = [("tlx_detail", (self.device_id,))]
+        elif self.growatt_type == "storage":
+            endpoints = [
+                ("storage_params", (self.device_id,)),
+                ("storage_energy_overview", (self.plant_id, self.device_id)),
+            ]
+        else:
+            return []
+        if keys is None:
+            return endpoints
+        providers = ENDPOINT_BY_API_KEY.get(self.growatt_type, {})
+        wanted = set()
+        for key in keys:
+            if key not in providers:
+                # Keys no sensor type reads, like inputs of custom derived
+                # sensors, may come from any call.
+                return endpoints
+            wanted.add(providers[key])
+        return [endpoint for endpoint in endpoints if endpoint[0] in wanted]
+
+    def _set_data(self, endpoints, results):
+        """Store the responses of the calls returned by _endpoints()."""
+        responses = {method: result for (method, _), result in zip(endpoints, results)}
+        if self.growatt_type == "total":
+            # Responses can be shared with other callers, copy instead of modifying.
+            total_info = {
+                key: value
+                for key, value in responses["plant_info"].items()
+                if key != "deviceList"
+            }
+            # PlantMoneyText comes in as "3.1/€" remove anything that isn't part of the number
+            total_info["plantMoneyText"] = re.sub(
+                r"[^\d.,]", "", total_info["plantMoneyText"]
+            )
+            data = total_info
+        elif self.growatt_type == "inverter":
+            data = responses["inverter_detail"]
+        elif self.growatt_type == "mix":
+            data = responses["mix_info2"]["obj"]
+        elif self.growatt_type == "tlx":
+            data = responses["tlx_detail"]["data"]
+        elif self.growatt_type == "storage":
+            # Keys of a call that was skipped keep their previous values.
+            data = {} if len(responses) == 2 else dict(self.data)
+            if "storage_params" in responses:
+                data.update(responses["storage_params"]["storageDetailBean"])
+            if "storage_energy_overview" in responses:
+                data.update(responses["storage_energy_overview"])
+        else:
+            return
+        if not isinstance(data, dict):
+            raise TypeError(f"expected an object, got {data!r}")
+        if self.derived:
+            data = derive(data, self.derived)
+        self.data = data
+        self.updated_at = dt_util.utcnow()
+        self.stale = False
+        _LOGGER.debug(self.data)
+
+    def push(self, values, keys):
+        """Store the api values a datalogger pushed over the last data.
+
+        Only the data of `keys`, the ones its frames can carry, is kept. The
+        sensors of other keys have no value while the datalogger pushes, the
+        device is not polled for them.
+        """
+        with self._lock:
+            data = {key: value for key, value in self.data.items() if key in keys}
+            data.update(values)
+            if self.derived:
+                data = derive(data, self.derived)
+            self.data = data
+            self.updated_at = self.pushed_at = dt_util.utcnow()
+            self.stale = False
+
+    def _timed_call(self, method, args):
+        """Call an API method, return its result and the seconds it took."""
+        started = time.monotonic()
+        result = getattr(self.api, method)(*args)
+        return result, time.monotonic() - started
+
+    async def _async_timed_call(self, method, args):
+        """Await an API method, return its result and the seconds it took."""
+        started = time.monotonic()
+        result = await getattr(self.api, method)(*args)
+        return result, time.monotonic() - started
+
+    def _set_timed(self, endpoints, timed):
+        """Store the (result, seconds) of the calls returned by _endpoints().
+
+        A malformed payload fails the fetch, the last good data goes stale.
+        """
+        try:
+            with self._lock:
+                self._set_data(endpoints, [result for result, _ in timed])
+        except PAYLOAD_ERRORS as err:
+            self._fetch_failed(f"malformed {self.growatt_type} data ({err!r})")
+            return
+        self.fetch_seconds = sum(seconds for _, seconds in timed)
+
+    def _fetch_failed(self, err):
+        """Log a failed fetch, the last good data keeps being served."""
+        if self.updated_at is None:
+            _LOGGER.error("Unable to fetch data from Growatt server: %s", err)
+        else:
+            _LOGGER.warning(
+                "Unable to fetch %s data from Growatt server, serving data from %s: %s",
+                self.device_id,
+                self.updated_at,
+                err,
+            )
+
+    def check_freshness(self, now):
+        """Mark the data stale if this cycle didn't fetch it, drop it once expired."""
+        if self.fetch_seconds is not None or self.pushed:
+            return
+        self.stale = True
+        if (
+            self.max_staleness is not None
+            and self.updated_at is not None
+            and self.data
+            and now - self.updated_at > self.max_staleness
+        ):
+            _LOGGER.warning(
+                "Data of %s is older than %s, no longer serving it",
+                self.device_id,
+                self.max_staleness,
+            )
+            self.data = {}
 
-    @Throttle(SCAN_INTERVAL)
     def update(self):
         """Update probe data."""
-        self.api.login(self.username, self.password)
-        _LOGGER.debug("Updating data for %s", self.device_id)
+        self.fetch_seconds = None
+        endpoints = self._endpoints()
+        if not endpoints:
+            return
+        _LOGGER.debug("Updating %s data for %s", self.growatt_type, self.device_id)
         try:
-            if self.growatt_type == "total":
-                total_info = self.api.plant_info(self.device_id)
-                _LOGGER.debug("Updating Total data for %s", self.device_id)
-                del total_info["deviceList"]
-                # PlantMoneyText comes in as "3.1/€" remove anything that isn't part of the number
-                total_info["plantMoneyText"] = re.sub(
-                    r"[^\d.,]", "", total_info["plantMoneyText"]
-                )
-                self.data = total_info
-                _LOGGER.debug(total_info)
-            elif self.growatt_type == "inverter":
-                _LOGGER.debug("Updating Inverter data for %s", self.device_id)
-                inverter_info = self.api.inverter_detail(self.device_id)
-                self.data = inverter_info
-                _LOGGER.debug(inverter_info)
-            elif self.growatt_type == "mix":
-                _LOGGER.debug("Updating MIX data for %s", self.device_id)
-                mix_info = self.api.mix_info2(self.device_id, self.plant_id)
-                self.data = mix_info['obj']
-                _LOGGER.debug(mix_info['obj'])
-            elif self.growatt_type == "tlx":
-                _LOGGER.debug("Updating TLX data for %s", self.device_id)
-                tlx_info = self.api.tlx_detail(self.device_id)
-                self.data = tlx_info['data']
-                _LOGGER.debug(tlx_info['data'])
-            elif self.growatt_type == "storage":
-                _LOGGER.debug("Updating Storage data for %s", self.device_id)
-                storage_info_detail = self.api.storage_params(self.device_id)[
-                    "storageDetailBean"
-                ]
-                storage_energy_overview = self.api.storage_energy_overview(
-                    self.plant_id, self.device_id
-                )
-                self.data = {**storage_info_detail, **storage_energy_overview}
-                _LOGGER.debug(storage_info_detail)
-                _LOGGER.debug(storage_energy_overview)
-        except json.decoder.JSONDecodeError:
-            _LOGGER.error("Unable to fetch data from Growatt server")
+            timed = [self._timed_call(method, args) for method, args in endpoints]
+        except FETCH_ERRORS as err:
+            self._fetch_failed(err)
+            return
+        self._set_timed(endpoints, timed)
+
+    def submit(self, executor):
+        """Start this probe's API calls on `executor` and return their futures."""
+        self.fetch_seconds = None
+        endpoints = self._endpoints()
+        if endpoints:
+            _LOGGER.debug("Updating %s data for %s", self.growatt_type, self.device_id)
+        # Every call runs in a copy of the caller's context to spend its budget.
+        return [
+            (
+                (method, args),
+                executor.submit(
+                    contextvars.copy_context().run, self._timed_call, method, args
+                ),
+            )
+            for method, args in endpoints
+        ]
+
+    def collect(self, futures):
+        """Wait for the futures returned by submit() and store their results."""
+        if not futures:
+            return
+        try:
+            timed = [future.result() for _, future in futures]
+        except FETCH_ERRORS as err:
+            self._fetch_failed(err)
+            return
+        self._set_timed([endpoint for endpoint, _ in futures], timed)
+
+    async def async_update(self):
+        """Update probe data through the async client, fetching all calls at once."""
+        self.fetch_seconds = None
+        endpoints = self._endpoints()
+        if not endpoints:
+            return
+        _LOGGER.debug("Updating %s data for %s", self.growatt_type, self.device_id)
+        try:
+            timed = await asyncio.gather(
+                *(self._async_timed_call(method, args) for method, args in endpoints)
+            )
+        except FETCH_ERRORS as err:
+            self._fetch_failed(err)
+            return
+        self._set_timed(endpoints, timed)
 
     def get_data(self, variable):
         """Get the data."""
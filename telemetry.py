@@ -0,0 +1,227 @@
+"""Request telemetry of the Growatt clients."""
+import bisect
+import threading
+
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import callback
+
+DATA_TELEMETRY = "growatt_telemetry"
+METRICS_URL = "/api/growatt/metrics"
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class EndpointStats:
+    """Counters and latency histogram of one endpoint."""
+
+    __slots__ = ("requests", "errors", "bytes", "seconds", "buckets")
+
+    def __init__(self):
+        """Initialize with nothing recorded."""
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        # One count per bucket of LATENCY_BUCKETS, plus one for slower requests.
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    @property
+    def mean(self):
+        """Return the mean latency in seconds, None before any request."""
+        return self.seconds / self.requests if self.requests else None
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket holding the `fraction` quantile.
+
+        Returns None before any request and when the quantile lies past the
+        largest bound, which has no finite upper bound to report.
+        """
+        if not self.requests:
+            return None
+        rank = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class GrowattTelemetry:
+    """Per endpoint request counts, errors, response sizes and latencies.
+
+    The clients record every HTTP request by endpoint, the page with its op
+    parameter, and every login. Coordinators record how long each device
+    took to fetch in its last cycle.
+    """
+
+    def __init__(self, account):
+        """Initialize with nothing recorded."""
+        self.account = account
+        self.endpoints = {}
+        self.logins = 0
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, endpoint):
+        """Return the stats of an endpoint, the lock must be held."""
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def record(self, endpoint, seconds, size):
+        """Record a request that took `seconds` and returned `size` bytes."""
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.requests += 1
+            stats.bytes += size
+            stats.seconds += seconds
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def record_error(self, endpoint):
+        """Record a failed request attempt."""
+        with self._lock:
+            self._stats(endpoint).errors += 1
+
+    def record_login(self):
+        """Record a login."""
+        with self._lock:
+            self.logins += 1
+
+    def record_device(self, device_id, seconds):
+        """Record the time the calls of a device took in the last cycle."""
+        with self._lock:
+            self.devices[device_id] = seconds
+
+    def device_seconds(self):
+        """Return a consistent copy of the (device id, seconds), sorted by device."""
+        with self._lock:
+            return sorted(self.devices.items())
+
+    @property
+    def requests(self):
+        """Return the number of requests sent."""
+        return sum(stats.requests for stats in list(self.endpoints.values()))
+
+    @property
+    def errors(self):
+        """Return the number of failed request attempts."""
+        return sum(stats.errors for stats in list(self.endpoints.values()))
+
+    @property
+    def bytes(self):
+        """Return the number of response bytes received."""
+        return sum(stats.bytes for stats in list(self.endpoints.values()))
+
+    @property
+    def mean_latency(self):
+        """Return the mean request latency in seconds, None before any request."""
+        stats = list(self.endpoints.values())
+        requests = sum(stat.requests for stat in stats)
+        if not requests:
+            return None
+        return sum(stat.seconds for stat in stats) / requests
+
+    def slowest_devices(self, count=5):
+        """Return the (device id, seconds) of the slowest devices of the last cycle."""
+        return sorted(self.device_seconds(), key=lambda item: item[1], reverse=True)[:count]
+
+    def prometheus(self):
+        """Return the telemetry in the Prometheus text exposition format."""
+        return prometheus_text([self])
+
+    def rows(self):
+        """Return a consistent copy of the endpoint stats, sorted by endpoint."""
+        with self._lock:
+            return sorted(
+                (endpoint, stats.requests, stats.errors, stats.bytes, stats.seconds,
+                 list(stats.buckets))
+                for endpoint, stats in self.endpoints.items()
+            )
+
+
+def prometheus_text(telemetries):
+    """Return the telemetry of several accounts in the Prometheus text format."""
+    lines = []
+    accounts = [(_label(item.account), item, item.rows()) for item in telemetries]
+
+    def header(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def endpoint_metric(name, help_text, column):
+        header(name, "counter", help_text)
+        for account, _, rows in accounts:
+            for row in rows:
+                lines.append(
+                    f'{name}{{account="{account}",endpoint="{_label(row[0])}"}} {row[column]}'
+                )
+
+    endpoint_metric("growatt_requests_total", "HTTP requests sent to the Growatt server.", 1)
+    endpoint_metric("growatt_request_errors_total", "Failed request attempts.", 2)
+    endpoint_metric("growatt_response_bytes_total", "Response bytes received.", 3)
+
+    name = "growatt_request_duration_seconds"
+    header(name, "histogram", "Latency of requests to the Growatt server.")
+    for account, _, rows in accounts:
+        for endpoint, requests, _, _, seconds, buckets in rows:
+            labels = f'account="{account}",endpoint="{_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {requests}')
+            lines.append(f"{name}_sum{{{labels}}} {seconds}")
+            lines.append(f"{name}_count{{{labels}}} {requests}")
+
+    header("growatt_logins_total", "counter", "Logins to the Growatt server.")
+    for account, item, _ in accounts:
+        lines.append(f'growatt_logins_total{{account="{account}"}} {item.logins}')
+
+    header(
+        "growatt_device_fetch_seconds",
+        "gauge",
+        "Time the calls of a device took in its last update cycle.",
+    )
+    for account, item, _ in accounts:
+        for device_id, seconds in item.device_seconds():
+            lines.append(
+                f'growatt_device_fetch_seconds{{account="{account}",'
+                f'device="{_label(device_id)}"}} {seconds}'
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class GrowattMetricsView(HomeAssistantView):
+    """Serve the telemetry of every Growatt account in the Prometheus format."""
+
+    url = METRICS_URL
+    name = "api:growatt:metrics"
+
+    async def get(self, request):
+        """Return the text snapshot of all registered telemetry."""
+        hass = request.app["hass"]
+        return web.Response(
+            text=prometheus_text(hass.data.get(DATA_TELEMETRY, [])),
+            content_type="text/plain",
+        )
+
+
+@callback
+def register_telemetry(hass, telemetry):
+    """Add telemetry to the metrics view, registering the view once."""
+    registered = hass.data.setdefault(DATA_TELEMETRY, [])
+    if telemetry in registered:
+        return
+    if not registered and getattr(hass, "http", None) is not None:
+        hass.http.register_view(GrowattMetricsView())
+    registered.append(telemetry)
@@ -0,0 +1,74 @@
+"""Fixtures loading the integration of this checkout like the benchmarks do."""
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import bench_update_cycle  # noqa: E402  pylint: disable=wrong-import-position
+
+
+@pytest.fixture(name="sensor", scope="session")
+def fixture_sensor():
+    """Return the sensor platform module."""
+    return bench_update_cycle.load_integration()
+
+
+@pytest.fixture(name="hass")
+def fixture_hass():
+    """Return a Home Assistant with only the parts the platform uses."""
+    hass = bench_update_cycle.BenchHass()
+    yield hass
+    hass.stop()
+
+
+class CountingApi:
+    """Client answering the device calls with fixed payloads and counting them."""
+
+    telemetry = None
+
+    def __init__(self, payloads=None):
+        """Initialize with the payload of every method, by name."""
+        self.payloads = payloads or {}
+        self.calls = []
+
+    def __getattr__(self, method):
+        """Return a call of `method` that records its arguments."""
+        if method not in self.payloads:
+            raise AttributeError(method)
+
+        def call(*args):
+            self.calls.append((method, args))
+            return self.payloads[method]
+
+        return call
+
+
+@pytest.fixture(name="setup_device")
+def fixture_setup_device(sensor, hass):
+    """Return a function adding a plant with one device of a type.
+
+    The function takes the client and the device type, and returns the
+    plants, the coordinator of the plant, the probe of the device and its
+    entities, which all listen to the coordinator.
+    """
+
+    def setup_device(api, device_type, config=None):
+        config = sensor.PLATFORM_SCHEMA(
+            {"platform": "growatt", "username": "user", "password": "secret", **(config or {})}
+        )
+        plants = sensor.GrowattPlants(hass, config, api)
+        # pylint: disable=protected-access
+        plants._add_plant("P1", "Plant")
+        entities = plants._add_device(
+            "P1", {"deviceSn": "SN1", "deviceType": device_type, "deviceAilas": "Device"}
+        )
+        coordinator = plants.coordinators["P1"]
+        coordinator._started = True
+        for entity in entities:
+            entity.schedule_update_ha_state = lambda force_refresh=False: None
+            coordinator.add_listener(entity)
+        return plants, coordinator, plants._probes[("P1", "SN1")], entities
+
+    return setup_device
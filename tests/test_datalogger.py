@@ -0,0 +1,67 @@
+"""Tests of the data pushed by dataloggers."""
+import importlib
+
+import pytest
+
+from conftest import CountingApi
+
+PAYLOADS = {
+    "plant_info": {"plantMoneyText": "1.0/€", "deviceList": []},
+    "inverter_detail": {"pac": 100.0},
+    "tlx_detail": {"data": {"pac": 100.0}},
+}
+
+
+def pushed_record(device_type, serial):
+    """Return the record of a frame carrying every register of a device type."""
+    datalogger = importlib.import_module("growatt.datalogger")
+    modbus = importlib.import_module("growatt.modbus")
+    blocks = [
+        (start, [1] * count)
+        for start, count, _ in modbus.batch_reads(
+            modbus.REGISTERS_BY_DEVICE_TYPE[device_type]
+        )
+    ]
+    frame = datalogger.encode_frame(
+        1,
+        6,
+        1,
+        datalogger.FUNCTION_DATA,
+        datalogger.encode_record(6, "DL1", serial, blocks),
+    )
+    (decoded,) = datalogger.FrameDecoder().feed(frame)
+    return datalogger.parse_record(decoded)
+
+
+@pytest.mark.parametrize("device_type", ["inverter", "tlx"])
+def test_pushed_device_is_not_polled(setup_device, device_type):
+    """A device whose datalogger pushes every register makes no calls."""
+    api = CountingApi(PAYLOADS)
+    plants, coordinator, probe, entities = setup_device(api, device_type)
+    coordinator.on_loop = True
+    coordinator.refresh()
+    assert any(args == ("SN1",) for _, args in api.calls)
+
+    api.calls.clear()
+    plants.push(pushed_record(device_type, "SN1"))
+    coordinator.refresh()
+    coordinator.refresh()
+
+    assert not any(args == ("SN1",) for _, args in api.calls)
+    assert not probe.stale
+    power = next(entity for entity in entities if entity.description.api_key == "pac")
+    assert power.state == pytest.approx(6553.7)
+
+
+def test_uncarried_keys_have_no_value(setup_device):
+    """Values the register map lacks are not served from before the push."""
+    api = CountingApi({**PAYLOADS, "inverter_detail": {"pac": 100.0, "vpv3": 300.0}})
+    plants, coordinator, probe, _ = setup_device(api, "inverter")
+    coordinator.on_loop = True
+    coordinator.refresh()
+    assert probe.data["vpv3"] == 300.0
+
+    plants.push(pushed_record("inverter", "SN1"))
+
+    assert "vpv3" not in probe.data
+    assert probe.data["pac"] == pytest.approx(6553.7)
@@ -0,0 +1,43 @@
+"""Tests of the energy accumulated from power sensors."""
+import datetime
+
+import pytest
+
+from conftest import CountingApi
+
+START = datetime.datetime(2026, 6, 1, 10, tzinfo=datetime.timezone.utc)
+
+
+def energy_sensor(entities, api_key):
+    """Return the energy sensor integrating the power of `api_key`."""
+    return next(
+        entity
+        for entity in entities
+        if entity.description.api_key == api_key and entity.unique_id.endswith("-energy")
+    )
+
+
+def refresh_at(sensor, monkeypatch, coordinator, when):
+    """Run a cycle of `coordinator` as if it was `when`."""
+    monkeypatch.setattr(sensor.dt_util, "utcnow", lambda: when)
+    coordinator.refresh()
+
+
+def test_mix_power_in_kilowatts(sensor, setup_device, monkeypatch):
+    """Mix powers arrive in kW and add their kWh unscaled, flat or not."""
+    payload = {"obj": {"pPv1": "2.0", "pPv2": "0.5", "ppv": "2.5", "pactogrid": "1.0"}}
+    api = CountingApi({"plant_info": {"plantMoneyText": "0/€"}, "mix_info2": payload})
+    _, coordinator, _, entities = setup_device(
+        api, "mix", {"accumulate_energy": True}
+    )
+    input_1 = energy_sensor(entities, "pPv1")
+    export = energy_sensor(entities, "pactogrid")
+
+    for minutes in (0, 30, 60, 90):
+        refresh_at(
+            sensor, monkeypatch, coordinator, START + datetime.timedelta(minutes=minutes)
+        )
+
+    assert input_1.unit_of_measurement == "kWh"
+    assert input_1.state == pytest.approx(3.0)
+    assert export.state == pytest.approx(1.5)
@@ -0,0 +1,185 @@
+"""Record the HTTP traffic of the Growatt client and replay it without network.
+
+Exchanges are stored one JSON object per line in a gzip compressed file. Each
+holds the request key (method, path with query and a digest of the body, so
+credentials are not stored), the recorded latency and the response. Replay
+serves the responses of every key in recorded order, repeating the last one
+when a run makes more requests than were recorded.
+"""
+import base64
+import collections
+import gzip
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMING_ORIGINAL = "original"
+TIMING_FAST = "fast"
+
+# Response headers kept in the archive, the client only reads these.
+RECORDED_HEADERS = ("Content-Type", "Location")
+
+# Seconds between flushes of the archive, a crash loses at most this much.
+FLUSH_INTERVAL = 30.0
+
+
+def exchange_key(method, url, body):
+    """Return the key matching a request with its recorded exchange."""
+    parts = urllib.parse.urlsplit(url)
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:16] if body else "-"
+    return f"{method} {parts.path.lstrip('/')}?{parts.query} {digest}"
+
+
+class ArchiveWriter:
+    """Append exchanges to an archive, safe to use from several threads."""
+
+    def __init__(self, path):
+        """Open the archive, adding to what it already holds."""
+        self.path = path
+        self._file = gzip.open(path, "ab")
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def write(self, key, elapsed, response):
+        """Add the exchange of a request with `key` answered by `response`."""
+        exchange = {
+            "key": key,
+            "at": time.time(),
+            "elapsed": round(elapsed, 4),
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in RECORDED_HEADERS
+                if name in response.headers
+            },
+        }
+        content = response.content
+        try:
+            exchange["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            exchange["body_b64"] = base64.b64encode(content).decode("ascii")
+        line = (json.dumps(exchange, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            # Every flush ends a compressed block, doing so for every exchange
+            # costs a sync and compression, readers skip a truncated tail.
+            now = time.monotonic()
+            if now - self._flushed >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = now
+
+    def close(self):
+        """Close the archive."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ArchiveReader:
+    """Serve the recorded exchanges of an archive by request key."""
+
+    def __init__(self, path):
+        """Load the archive."""
+        self.path = path
+        self._exchanges = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            try:
+                for line in archive:
+                    if line.strip():
+                        exchange = json.loads(line)
+                        self._exchanges[exchange["key"]].append(exchange)
+            except (EOFError, json.JSONDecodeError):
+                # An archive not closed cleanly ends mid stream, keep what was flushed.
+                _LOGGER.warning("Archive %s is truncated, replaying %s exchanges", path, len(self))
+
+    def __len__(self):
+        """Return the number of exchanges left to replay."""
+        return sum(len(exchanges) for exchanges in self._exchanges.values())
+
+    def next(self, key):
+        """Return the next exchange recorded for `key`, None if there is none."""
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                return None
+            if len(exchanges) > 1:
+                return exchanges.popleft()
+            return exchanges[0]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTP adapter writing every exchange to an archive."""
+
+    def __init__(self, writer, **kwargs):
+        """Initialize the adapter, `kwargs` go to HTTPAdapter."""
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send the request and record it with its response."""
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        # Reading the content here leaves it cached on the response.
+        response.content  # pylint: disable=pointless-statement
+        self.writer.write(
+            exchange_key(request.method, request.url, request.body),
+            time.monotonic() - started,
+            response,
+        )
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Adapter answering requests from an archive instead of the network."""
+
+    def __init__(self, reader, timing=TIMING_FAST, **kwargs):
+        """Initialize the adapter, connection pool arguments are ignored."""
+        super().__init__()
+        self.reader = reader
+        self.timing = timing
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        """Return the recorded response of the request."""
+        key = exchange_key(request.method, request.url, request.body)
+        exchange = self.reader.next(key)
+        if exchange is None:
+            _LOGGER.warning("No recorded response for %s", key)
+            exchange = {"status": 404, "headers": {}, "body": "", "elapsed": 0}
+        if self.timing == TIMING_ORIGINAL:
+            time.sleep(exchange["elapsed"])
+
+        if "body_b64" in exchange:
+            content = base64.b64decode(exchange["body_b64"])
+        else:
+            content = exchange["body"].encode("utf-8")
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response.raw = io.BytesIO(content)
+        response._content = content  # pylint: disable=protected-access
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        """Nothing to release."""